@@ -0,0 +1,63 @@
+"""
+Benchmark the build time and memory of each envelope engine.
+
+Each engine is run in a fresh process on the same synthesized runs (see bench_envelope.py) and
+the growth of the peak resident memory during the build is reported, e.g.
+
+    python benchmark/bench_engines.py --rows 2000000 --runs 2 --engines convex alpha
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pygui")
+if SRCDIR not in sys.path:
+    sys.path.insert(0, SRCDIR)
+
+from bench_envelope import make_run
+from data.envelope import ENGINES, create_envelope
+
+
+def peak_memory():
+    # bytes on linux, where ru_maxrss is given in kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build(engine, rows, nruns):
+    runs = [make_run(rows, seed) for seed in range(nruns)]
+    kwargs = {}
+    if engine == 'grid':
+        # the grid must cover the data up front
+        kwargs['xlim'] = (min(run['A'].min() for run in runs), max(run['A'].max() for run in runs))
+        kwargs['ylim'] = (min(run['B'].min() for run in runs), max(run['B'].max() for run in runs))
+    memory0 = peak_memory()
+    start = time.perf_counter()
+    env = create_envelope('A', 'B', runs, engine=engine, **kwargs)
+    # boundaries may be computed lazily
+    nvertices = len(env.vertices)
+    elapsed = time.perf_counter() - start
+    return elapsed, peak_memory() - memory0, nvertices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help="rows per run")
+    parser.add_argument('--runs', type=int, default=2, help="number of runs")
+    parser.add_argument('--engines', nargs='+', default=sorted(ENGINES), choices=sorted(ENGINES),
+                        help="the engines to benchmark")
+    args = parser.parse_args()
+
+    print("%d runs x %d rows" % (args.runs, args.rows))
+    print("%-12s %10s %12s %10s" % ("engine", "time (s)", "memory (MB)", "vertices"))
+    context = mp.get_context('spawn')
+    for engine in args.engines:
+        with context.Pool(1) as pool:
+            elapsed, memory, nvertices = pool.apply(build, (engine, args.rows, args.runs))
+        print("%-12s %10.3f %12.1f %10d" % (engine, elapsed, memory / 2 ** 20, nvertices))
+
+
+if __name__ == '__main__':
+    main()
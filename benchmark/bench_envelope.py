@@ -0,0 +1,65 @@
+"""
+Benchmark Envelope construction with and without the pre-hull filter.
+
+Runs are synthesized with the same schema as the CSVs in test/data (TIME, A, B, C, D, E)
+and scaled to the requested number of rows, e.g.
+
+    python benchmark/bench_envelope.py --rows 2000000 --runs 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pygui")
+if SRCDIR not in sys.path:
+    sys.path.insert(0, SRCDIR)
+
+from data import Run
+from data.envelope import Envelope
+
+
+def make_run(rows, seed):
+    rng = np.random.default_rng(seed)
+    time_ = np.linspace(0., rows / 100., rows)
+    data = {'TIME': time_}
+    for i, column in enumerate('ABCDE'):
+        # a noisy time history, most of which lies well inside its envelope
+        data[column] = (5. * np.sin(time_ / (i + 2.)) + np.cumsum(rng.normal(scale=0.01, size=rows)) +
+                        rng.normal(scale=0.5, size=rows))
+    return Run(data, name="run%d" % seed)
+
+
+def time_envelope(runs, repeat, **kwargs):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        env = Envelope('A', 'B', runs, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help="rows per run")
+    parser.add_argument('--runs', type=int, default=4, help="number of runs")
+    parser.add_argument('--repeat', type=int, default=3, help="timing repetitions, the best is reported")
+    args = parser.parse_args()
+
+    runs = [make_run(args.rows, seed) for seed in range(args.runs)]
+    print("%d runs x %d rows" % (args.runs, args.rows))
+
+    t0, env0 = time_envelope(runs, args.repeat)
+    t1, env1 = time_envelope(runs, args.repeat, prefilter=True)
+    assert np.allclose(sorted(env0.envelope_x()), sorted(env1.envelope_x()))
+
+    print("%-12s %10s %10s" % ("", "time (s)", "points"))
+    print("%-12s %10.3f %10d" % ("qhull only", t0, env0.npoints))
+    print("%-12s %10.3f %10d" % ("prefilter", t1, env1.npoints))
+    print("speedup: %.1fx" % (t0 / t1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark reading a CSV with and without a RunCache.
+
+A Run is synthesized (see bench_envelope.py), written to a temporary CSV and read back, first
+with pandas and then from a warm cache, where only the columns which are used are paged in, e.g.
+
+    python benchmark/bench_run_cache.py --rows 2000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pygui")
+if SRCDIR not in sys.path:
+    sys.path.insert(0, SRCDIR)
+
+from bench_envelope import make_run
+from data import Run, RunCache
+
+
+def time_read(filepath, cache=None, column=None):
+    start = time.perf_counter()
+    run = Run.read_csv(filepath, cache=cache)
+    if column is not None:
+        # touch every page of a single column
+        run[column].sum()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help="rows of the CSV")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        filepath = os.path.join(directory, "run.csv")
+        make_run(args.rows, 0).to_csv(filepath, index=False)
+        cache = RunCache(os.path.join(directory, "cache"))
+
+        print("%d rows, %.1f MB" % (args.rows, os.path.getsize(filepath) / 2 ** 20))
+        print("%-24s %10s" % ("read", "time (s)"))
+        print("%-24s %10.3f" % ("csv", time_read(filepath)))
+        print("%-24s %10.3f" % ("csv, populate cache", time_read(filepath, cache=cache)))
+        print("%-24s %10.3f" % ("cache", time_read(filepath, cache=cache)))
+        print("%-24s %10.3f" % ("cache, one column", time_read(filepath, cache=cache, column='A')))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
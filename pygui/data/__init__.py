@@ -1 +1,4 @@
-from .run import Run, RunSet
+from .cache import RunCache
+from .panel import RunPanel
+from .run import LazyRun, Run, RunHandle, RunSet
+from .summary import RunSummary
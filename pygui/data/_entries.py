@@ -0,0 +1,123 @@
+"""
+Naming and writing of the entries of the on-disk caches of data read from files, see RunCache and EnvelopeCache.
+
+An entry is named by the hashes of the file's path, of a key describing what was cached and of the file's
+modification time and size, so that the entries of a file are found by its path and an entry is no longer
+used once its file changes.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from contextlib import contextmanager
+
+
+def abspath(filepath):
+    return os.path.normcase(os.path.abspath(filepath))
+
+
+def entry_name(filepath, key):
+    """
+    Name the cache entry of a file.
+
+    Parameters
+    ----------
+    filepath: str
+        The file which was read.
+    key: str
+        A description of what was cached, e.g. the JSON of the keyword arguments the file was read with.
+
+    Returns
+    -------
+    name: str
+
+    Raises
+    ------
+    OSError
+        If the file cannot be accessed.
+    """
+    stat = os.stat(filepath)
+    return '-'.join([hash_string(abspath(filepath)), hash_string(key),
+                     hash_string(json.dumps([stat.st_mtime_ns, stat.st_size]))])
+
+
+def file_entries(directory, filepath):
+    """
+    Find all of the entries of a file, for any key and version of the file.
+
+    Parameters
+    ----------
+    directory: str
+        The directory in which the entries are stored.
+    filepath: str
+        The file which was read.
+
+    Returns
+    -------
+    paths: list(str)
+    """
+    return glob.glob(os.path.join(directory, hash_string(abspath(filepath)) + '-*'))
+
+
+def hash_string(string):
+    return hashlib.sha1(string.encode('utf-8')).hexdigest()[:16]
+
+
+def is_cacheable(dtype):
+    # entries are loaded without pickle support, so only numeric, boolean and datetime data can be read back
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufmM'
+
+
+def remove_outdated(path, remove):
+    """
+    Remove the entries of earlier versions of the file of an entry.
+
+    Parameters
+    ----------
+    path: str
+        The path of the entry.
+    remove: callable
+        Called as remove(path) to remove an entry.
+    """
+    for outdated in glob.glob(path.rsplit('-', 1)[0] + '-*'):
+        remove(outdated)
+
+
+@contextmanager
+def staged_entry(path, remove, directory=False):
+    """
+    Write an entry to a temporary path which is moved into place once it is complete.
+
+    Concurrent readers therefore never see a partial entry.
+
+    Parameters
+    ----------
+    path: str
+        The path of the entry.
+    remove: callable
+        Called as remove(path) to remove the temporary path if the entry is not completed.
+    directory: bool, optional. Default=False.
+        The entry is a directory rather than a file.
+
+    Yields
+    ------
+    tmp: str
+        The temporary path to be written. It has the same extension as the entry.
+    """
+    root = os.path.dirname(path)
+    if directory:
+        tmp = tempfile.mkdtemp(dir=root)
+    else:
+        fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=root)
+        os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        remove(tmp)
+        raise
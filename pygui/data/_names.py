@@ -0,0 +1,46 @@
+from uuid import UUID
+
+
+def decode_name(name):
+    """
+    Restore a name stored by encode_name.
+
+    Parameters
+    ----------
+    name: str, int, float, dict or None
+        The stored name.
+
+    Returns
+    -------
+    name: str, int, float, UUID or None
+    """
+    return UUID(name['uuid']) if isinstance(name, dict) else name
+
+
+def encode_name(name):
+    """
+    Convert a Run or Envelope name to JSON, so that it is restored with its type by decode_name.
+
+    Names are used as lookup keys, so a name which could not be restored as it was is rejected
+    rather than stored as a string.
+
+    Parameters
+    ----------
+    name: str, int, float, UUID or None
+        The name.
+
+    Returns
+    -------
+    name: str, int, float, dict or None
+
+    Raises
+    ------
+    ValueError
+        If the name is of any other type.
+    """
+    # the default names are UUIDs, which are tagged so that they are restored as UUIDs
+    if isinstance(name, UUID):
+        return {'uuid': str(name)}
+    if name is None or isinstance(name, (str, int, float)):
+        return name
+    raise ValueError("Cannot store the name %r, names must be a str, int, float or UUID." % (name,))
@@ -0,0 +1,245 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+
+from pandas import DataFrame, Index, RangeIndex
+
+from ._entries import abspath, entry_name, file_entries, is_cacheable, remove_outdated, staged_entry
+
+
+class RunCache(object):
+    """
+    An on-disk columnar cache of Runs read from CSV files.
+
+    Each entry stores the columns of one CSV as one .npy file per column, which are memory mapped
+    when the entry is read so that only the pages of the columns which are used are read from disk.
+    Entries are keyed by the file's path, modification time and size along with the read keyword
+    arguments, so an entry is no longer used once its file changes.
+
+    Parameters
+    ----------
+    directory: str or None, optional. Default=None.
+        The directory in which the cache entries are stored. Created if it does not exist. If None,
+        the entries of each CSV are stored in a sidecar directory next to it, see SIDECAR_SUFFIX.
+
+    Notes
+    -----
+    .. [1] Only CSVs whose columns and index are all numeric, boolean or datetime are cached.
+    .. [2] The memory mapped columns are copy-on-write, changes to a Run are never written to the cache.
+    """
+
+    SIDECAR_SUFFIX = '.runcache'
+
+    META = 'meta.json'
+
+    def __init__(self, directory=None):
+        self.directory = directory
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def clear(self):
+        """
+        Remove all entries from the cache directory.
+
+        Sidecar directories are not searched for, use invalidate to remove the entries of a file.
+        """
+        if self.directory is None:
+            return
+        for path in glob.glob(os.path.join(self.directory, '*-*-*')):
+            self._remove(path)
+
+    def get(self, filepath, **kwargs):
+        """
+        Get the cached data of a CSV.
+
+        Parameters
+        ----------
+        filepath: str
+            The CSV which was read.
+        **kwargs
+            The keyword arguments the CSV was read with.
+
+        Returns
+        -------
+        frame: pandas.DataFrame or None
+            The data of the CSV with memory mapped columns, or None if the CSV is not in the cache,
+            has changed since it was cached or cannot be cached.
+        """
+        path = self._entry_path(filepath, kwargs)
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, self.META)) as f:
+                meta = json.load(f)
+            columns = {name: np.load(os.path.join(path, '%d.npy' % i), mmap_mode='c')
+                       for i, name in enumerate(meta['columns'])}
+            index = self._load_index(path, meta['index'])
+        except (OSError, KeyError, ValueError):
+            return None
+        return DataFrame(columns, index=index, copy=False)
+
+    def get_column(self, filepath, column, **kwargs):
+        """
+        Get a single cached column of a CSV.
+
+        Parameters
+        ----------
+        filepath: str
+            The CSV which was read.
+        column: str
+            The name of the column.
+        **kwargs
+            The keyword arguments the CSV was read with.
+
+        Returns
+        -------
+        values: numpy.memmap or None
+            The memory mapped column, or None if the CSV or column is not in the cache.
+        """
+        meta = self.get_meta(filepath, **kwargs)
+        if meta is None or column not in meta['columns']:
+            return None
+        path = self._entry_path(filepath, kwargs)
+        try:
+            return np.load(os.path.join(path, '%d.npy' % meta['columns'].index(column)), mmap_mode='c')
+        except (OSError, ValueError):
+            return None
+
+    def get_index(self, filepath, **kwargs):
+        """
+        Get the cached index of a CSV.
+
+        Parameters
+        ----------
+        filepath: str
+            The CSV which was read.
+        **kwargs
+            The keyword arguments the CSV was read with.
+
+        Returns
+        -------
+        index: pandas.Index or None
+            The index, or None if the CSV is not in the cache.
+        """
+        meta = self.get_meta(filepath, **kwargs)
+        if meta is None:
+            return None
+        try:
+            return self._load_index(self._entry_path(filepath, kwargs), meta['index'])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def get_meta(self, filepath, **kwargs):
+        """
+        Get the description of the cached data of a CSV without reading any of its columns.
+
+        Parameters
+        ----------
+        filepath: str
+            The CSV which was read.
+        **kwargs
+            The keyword arguments the CSV was read with.
+
+        Returns
+        -------
+        meta: dict or None
+            The column names under 'columns', the number of rows under 'nrows' and a description of
+            the index under 'index', or None if the CSV is not in the cache.
+        """
+        path = self._entry_path(filepath, kwargs)
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, self.META)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def invalidate(self, filepath):
+        """
+        Remove all entries of a CSV from the cache.
+
+        Parameters
+        ----------
+        filepath: str
+            The CSV whose entries are removed.
+        """
+        for path in file_entries(self._root(filepath), filepath):
+            self._remove(path)
+
+    def put(self, filepath, frame, **kwargs):
+        """
+        Store the data of a CSV, replacing any outdated entry.
+
+        Parameters
+        ----------
+        filepath: str
+            The CSV which was read.
+        frame: pandas.DataFrame
+            The data read from the CSV.
+        **kwargs
+            The keyword arguments the CSV was read with.
+
+        Returns
+        -------
+        cached: bool
+            False if the data cannot be cached.
+        """
+        path = self._entry_path(filepath, kwargs)
+        index = self._describe_index(frame.index)
+        if path is None or index is None or not all(is_cacheable(dtype) for dtype in frame.dtypes):
+            return False
+        meta = {'columns': list(frame.columns), 'index': index, 'nrows': len(frame)}
+        try:
+            meta = json.dumps(meta)
+        except TypeError:
+            return False
+
+        try:
+            remove_outdated(path, self._remove)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with staged_entry(path, self._remove, directory=True) as tmp:
+                for i, name in enumerate(frame.columns):
+                    np.save(os.path.join(tmp, '%d.npy' % i), frame[name].to_numpy())
+                if index['kind'] == 'array':
+                    np.save(os.path.join(tmp, 'index.npy'), frame.index.to_numpy())
+                with open(os.path.join(tmp, self.META), 'w') as f:
+                    f.write(meta)
+        except OSError:
+            # the cache directory cannot be written, or another process stored the same entry in the meantime
+            return os.path.isdir(path)
+        return True
+
+    @staticmethod
+    def _describe_index(index):
+        if isinstance(index, RangeIndex):
+            return {'kind': 'range', 'start': index.start, 'stop': index.stop, 'step': index.step, 'name': index.name}
+        if index.nlevels == 1 and is_cacheable(index.dtype):
+            return {'kind': 'array', 'name': index.name}
+        return None
+
+    def _entry_path(self, filepath, kwargs):
+        try:
+            name = entry_name(filepath, json.dumps(kwargs, sort_keys=True))
+        except (TypeError, OSError):
+            return None
+        return os.path.join(self._root(filepath), name)
+
+    @staticmethod
+    def _load_index(path, index):
+        if index['kind'] == 'range':
+            return RangeIndex(index['start'], index['stop'], index['step'], name=index['name'])
+        return Index(np.load(os.path.join(path, 'index.npy')), name=index['name'])
+
+    @staticmethod
+    def _remove(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+    def _root(self, filepath):
+        if self.directory is not None:
+            return self.directory
+        return abspath(filepath) + self.SIDECAR_SUFFIX
@@ -1 +1,6 @@
+from ._alpha import AlphaEnvelope
+from ._base import BaseEnvelope, ExceedanceReport
+from ._engines import ENGINES, create_envelope
 from ._envelope import Envelope, EnvelopeSet
+from ._grid import GridEnvelope
+from .cache import EnvelopeCache
@@ -0,0 +1,180 @@
+import numpy as np
+
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import Delaunay
+from uuid import uuid4
+
+from ._base import BaseEnvelope
+from ._polygon import boundary_rings, signed_area
+from ._refs import PointRefArray
+
+
+def alpha_boundary(points, alpha, resolution=None):
+    """
+    Get the outer boundary of the alpha shape of a set of points.
+
+    The alpha shape is the union of the Delaunay triangles whose circumradius is below alpha.
+    Only the largest connected region of the shape is considered and its holes are ignored.
+
+    Parameters
+    ----------
+    points: numpy.array (ndim=2)
+        An (n, 2) array of x, y coordinates.
+    alpha: float
+        The largest circumradius of the triangles forming the shape, in coordinates scaled so
+        that the points span the unit square.
+    resolution: float or None, optional. Default=None.
+        Only triangulate the first point within each square cell of size resolution * alpha, in
+        the scaled coordinates. This bounds the cost for large numbers of points, at the expense
+        of moving the boundary by up to sqrt(2) * resolution * alpha. All points are triangulated if None.
+
+    Returns
+    -------
+    vertices: numpy.array(int)
+        The positions of the boundary vertices within points, in counter-clockwise order.
+    """
+    lo = points.min(axis=0)
+    span = np.ptp(points, axis=0)
+    span[span == 0.] = 1.
+    scaled = (points - lo) / span
+
+    sample = None
+    if resolution is not None:
+        ncells = int(np.ceil(1. / (resolution * alpha))) + 1
+        cells = np.floor(scaled / (resolution * alpha)).astype(np.int64)
+        _, sample = np.unique(cells[:, 0] * ncells + cells[:, 1], return_index=True)
+        scaled = scaled[sample]
+
+    tri = Delaunay(scaled)
+    simplices = tri.simplices
+    a, b, c = (scaled[simplices[:, i]] for i in range(3))
+    cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    area2 = np.abs(cross)
+    product = np.hypot(*(b - c).T) * np.hypot(*(c - a).T) * np.hypot(*(a - b).T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kept = (area2 > 0.) & (product / (2. * area2) < alpha)
+    if not np.any(kept):
+        raise ValueError("No triangle has a circumradius below alpha=%g, alpha must be increased." % alpha)
+
+    # group the kept triangles into regions of triangles sharing an edge and keep the largest
+    nkept = np.count_nonzero(kept)
+    position = np.full(len(simplices) + 1, -1)
+    position[np.flatnonzero(kept)] = np.arange(nkept)
+    # neighbor -1 (none) wraps around to the trailing -1 entry
+    neighbors = position[tri.neighbors[kept]]
+    rows, cols = np.nonzero(neighbors >= 0)
+    graph = coo_matrix((np.ones(len(rows)), (rows, neighbors[rows, cols])), shape=(nkept, nkept))
+    _, labels = connected_components(graph, directed=False)
+    largest = np.argmax(np.bincount(labels, weights=area2[kept]))
+    triangles = simplices[kept][labels == largest]
+    # orient the triangles counter-clockwise so that the boundary edges are directed counter-clockwise
+    clockwise = cross[kept][labels == largest] < 0.
+    triangles[clockwise] = triangles[clockwise][:, [0, 2, 1]]
+
+    # edges inside the region are shared by two triangles, boundary edges belong to only one
+    edges = np.vstack([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    keys = edges.min(axis=1).astype(np.int64) * len(scaled) + edges.max(axis=1)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    rings = boundary_rings(edges[counts[inverse] == 1])
+    vertices = max(rings, key=lambda ring: signed_area(scaled[ring]))
+    return vertices if sample is None else sample[vertices]
+
+
+class AlphaEnvelope(BaseEnvelope):
+    """
+    An envelope which follows the concave regions of its data.
+
+    The envelope is the outer boundary of the alpha shape of its points. See alpha_boundary.
+
+    Parameters
+    ----------
+    xname: str
+        The name of the x data of the Runs.
+    yname: str
+        The name of the y data of the Runs.
+    runs: Run or list(Run)
+        The Runs to be enveloped.
+    alpha: float, optional. Default=0.05.
+        The largest circumradius of the triangles forming the envelope, in coordinates scaled so
+        that the points span the unit square. Smaller values follow the data more closely.
+    resolution: float or None, optional. Default=1/16.
+        Points within the same cell of size resolution * alpha are merged before the boundary is
+        computed. See alpha_boundary.
+    description: str, optional. Default="".
+        Additional details about the envelope to be used in reports, etc.
+    name: str or None, optional. Default=None.
+        Identifying name for the envelope. If a name is not provided, a unique ID is generated.
+
+    Notes
+    -----
+    .. [1] All points and their references are kept since any point may become a vertex as points
+           are added. The boundary is recomputed when it is next accessed after points are added.
+    .. [2] Holes and regions which are disconnected from the largest region are not part of the envelope.
+    """
+
+    DEFAULT_ALPHA = 0.05
+
+    DEFAULT_RESOLUTION = 1. / 16.
+
+    keep_all = True
+
+    def __init__(self, xname, yname, runs, alpha=DEFAULT_ALPHA, resolution=DEFAULT_RESOLUTION, description="",
+                 name=None):
+        if not any(isinstance(runs, o) for o in (list, tuple)):
+            runs = [runs]
+
+        self._initialize(xname, yname, alpha=alpha, resolution=resolution, description=description, name=name)
+        for run in runs:
+            self.add_run(run)
+
+    @property
+    def npoints(self):
+        return len(self.refs)
+
+    @property
+    def points(self):
+        if len(self._batches) != 1:
+            self._batches = [np.vstack(self._batches) if self._batches else np.empty((0, 2))]
+        return self._batches[0]
+
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self._vertices = alpha_boundary(self.points, self.alpha, resolution=self.resolution)
+        return self._vertices
+
+    @classmethod
+    def from_points(cls, xname, yname, x, y, parents, indices, alpha=DEFAULT_ALPHA, resolution=DEFAULT_RESOLUTION,
+                    description="", name=None):
+        env = cls.__new__(cls)
+        env._initialize(xname, yname, alpha=alpha, resolution=resolution, description=description, name=name)
+        env.add_points(x, y, parents, indices)
+        return env
+
+    def _add_batch(self, points, parents, indices):
+        self._batches.append(np.asarray(points, dtype=float))
+        self.refs.extend(parents, indices)
+        self._vertices = None
+        self._invalidate_perimeter()
+
+    def _engine_kwargs(self):
+        return {'alpha': self.alpha, 'resolution': self.resolution}
+
+    def _export_points(self, all_points=False):
+        # interior points shape the concave boundary of a merged envelope, so they are always exported
+        return super()._export_points(all_points=True)
+
+    def _initialize(self, xname, yname, alpha=DEFAULT_ALPHA, resolution=DEFAULT_RESOLUTION, description="", name=None):
+        self.xname = xname
+        self.yname = yname
+
+        self.name = name if name is not None else uuid4()
+        self.description = description
+        self.alpha = alpha
+        self.resolution = resolution
+
+        self._batches = []
+        self._refs = PointRefArray()
+        self._vertices = None
+        self._invalidate_perimeter()
@@ -0,0 +1,280 @@
+import os
+import sys
+
+import collections
+import numpy as np
+
+from matplotlib.path import Path
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from data import RunHandle
+from widget.plot import PickableAxes
+
+from ._simplify import simplify_polygon
+
+ExceedanceReport = collections.namedtuple('ExceedanceReport', ['run', 'indices', 'distances', 'max_distance'])
+
+
+class BaseEnvelope(object):
+    """
+    The engine independent interface of an envelope.
+
+    An engine provides the points of the envelope, the positions of its boundary vertices within
+    them in perimeter order and the (run, index) reference of each point as a PointRefArray.
+    Subclasses implement the points, vertices and refs attributes along with _add_batch. Point
+    queries are evaluated against the perimeter polygon, engines with a cheaper test override
+    contains and distance_to_boundary.
+    """
+
+    QUERY_CHUNKSIZE = 65536
+    """
+    The maximum number of query points evaluated at once by contains and distance_to_boundary.
+    """
+
+    @property
+    def closed_vertices(self):
+        # cached until the boundary changes, read-only since it is shared between callers
+        if self._closed_vertices is None:
+            self._closed_vertices = self._read_only(np.hstack([self.vertices, [self.vertices[0]]]))
+        return self._closed_vertices
+
+    @property
+    def perimeter(self):
+        if self._perimeter is None:
+            self._perimeter = self._read_only(self.points[self.closed_vertices, :])
+        return self._perimeter
+
+    @property
+    def refs(self):
+        return self._refs
+
+    def absorb_envelopes(self, envelopes):
+        if not any(isinstance(envelopes, o) for o in (list, tuple)):
+            envelopes = [envelopes]
+        for env in envelopes:
+            self._absorb_envelope(env)
+
+    def add_points(self, x, y, parents, indices):
+        # parents may be a single parent of all of the points
+        assert len(x) == len(y) == len(indices)
+        assert len(parents) == len(x) if any(isinstance(parents, o) for o in (list, tuple, np.ndarray)) else True
+        points = self._stack_points(x, y)
+        self._add_batch(points, parents, indices)
+
+    def add_run(self, run, report=False):
+        """
+        Add the data of a Run to the envelope.
+
+        Parameters
+        ----------
+        run: Run
+            The Run whose x, y data is added.
+        report: bool, optional. Default=False.
+            Report which rows of the Run lie outside of the envelope as it was before the Run was added.
+
+        Returns
+        -------
+        report: ExceedanceReport or None
+            The exceedance report if requested, otherwise None.
+        """
+        points = self._stack_points(run[self.xname], run[self.yname])
+        exceedance = None
+        if report:
+            distances = self.distance_to_boundary(points[:, 0], points[:, 1])
+            outside = np.flatnonzero(distances > 0.)
+            distances = distances[outside]
+            max_distance = distances.max() if len(distances) else 0.
+            exceedance = ExceedanceReport(run=run, indices=np.asarray(run.index)[outside], distances=distances,
+                                          max_distance=max_distance)
+        self._add_batch(points, run, run.index)
+        return exceedance
+
+    def contains(self, x, y, tolerance=0.):
+        """
+        Test whether points lie inside the envelope.
+
+        Parameters
+        ----------
+        x: float or array_like
+            The x data of the points.
+        y: float or array_like
+            The y data of the points.
+        tolerance: float, optional. Default=0.
+            Points up to this distance outside of the envelope are considered to be inside it.
+
+        Returns
+        -------
+        inside: bool or numpy.array(bool)
+        """
+        points, scalar = self._query_points(x, y)
+        inside = Path(self.perimeter).contains_points(points)
+        # points on the boundary are not reliably inside of the path
+        outside = ~inside
+        inside[outside] = self._segment_distances(points[outside]) <= tolerance
+        return inside[0] if scalar else inside
+
+    def distance_to_boundary(self, x, y):
+        """
+        Get the signed distance from points to the envelope boundary.
+
+        Parameters
+        ----------
+        x: float or array_like
+            The x data of the points.
+        y: float or array_like
+            The y data of the points.
+
+        Returns
+        -------
+        distance: float or numpy.array(float)
+            The distance to the nearest point of the boundary. Positive outside of the
+            envelope and negative inside of it.
+        """
+        points, scalar = self._query_points(x, y)
+        distance = self._segment_distances(points)
+        inside = Path(self.perimeter).contains_points(points)
+        distance[inside] *= -1.
+        return distance[0] if scalar else distance
+
+    def envelope_indices(self, closed=False):
+        vertices = self.closed_vertices if closed else self.vertices
+        return self.refs.get_indices(vertices)
+
+    def envelope_refs(self, closed=False):
+        for run, index in zip(self.envelope_runs(closed=closed), self.envelope_indices(closed=closed)):
+            yield run, index
+
+    def envelope_runs(self, closed=False):
+        vertices = self.closed_vertices if closed else self.vertices
+        return self.refs.get_runs(vertices)
+
+    def envelope_x(self, closed=False):
+        v = self.closed_vertices if closed else self.vertices
+        return self.points[v, 0]
+
+    def envelope_y(self, closed=False):
+        v = self.closed_vertices if closed else self.vertices
+        return self.points[v, 1]
+
+    def get_run_data(self, names, closed=False):
+        if isinstance(names, str):
+            names = [names]
+        refs = list(self.envelope_refs(closed=closed))
+
+        # only read the referenced rows of runs which have not been loaded from file
+        handles = {}
+        for run, i in refs:
+            if isinstance(run, RunHandle) and not run.is_loaded:
+                handles.setdefault(id(run), (run, []))[1].append(i)
+        rows = {key: run.read_rows(labels, names) for key, (run, labels) in handles.items()}
+
+        # the references are index labels of the runs
+        return [rows[id(run)].loc[i] if id(run) in rows else run[names].loc[i] for run, i in refs]
+
+    def plot(self, ax, *args, tolerance=None, **kwargs):
+        """
+        Plot the perimeter of the envelope.
+
+        Parameters
+        ----------
+        ax: matplotlib.axes.Axes
+            The axes to plot on. On a PickableAxes, the vertices are linked to their runs.
+        tolerance: float or None, optional. Default=None.
+            Plot the perimeter simplified to within this distance. See simplified_vertices.
+        *args
+            Variable length argument list to be passed into the axes plot function.
+        **kwargs
+            Arbitrary keyword arguments to be passed into the axes plot function.
+        """
+        vertices = self.closed_vertices if tolerance is None else self.simplified_vertices(tolerance, closed=True)
+        x = self.points[vertices, 0]
+        y = self.points[vertices, 1]
+        if isinstance(ax, PickableAxes):
+            parents = self.refs.get_runs(vertices)
+            indices = self.refs.get_indices(vertices)
+            ax.plot(x, y, parent=parents, indices=indices, *args, **kwargs)
+        else:
+            ax.plot(x, y, *args, **kwargs)
+
+    def simplified_vertices(self, tolerance, closed=False):
+        """
+        Get a reduced set of the envelope vertices for drawing.
+
+        Vertices are discarded while the simplified perimeter stays within the tolerance of the
+        full perimeter. The extreme vertices in x and y are always kept. The result for the most
+        recent tolerance is cached until the hull changes.
+
+        Parameters
+        ----------
+        tolerance: float
+            The maximum distance of a discarded vertex from the simplified perimeter.
+        closed: bool, optional. Default=False.
+            Repeat the first vertex at the end.
+
+        Returns
+        -------
+        vertices: numpy.array(int)
+            The positions of the kept vertices within points, in perimeter order.
+        """
+        if self._simplified is None or self._simplified[0] != tolerance:
+            vertices = self.vertices[simplify_polygon(self.points[self.vertices], tolerance)]
+            self._simplified = (tolerance, self._read_only(np.hstack([vertices, vertices[:1]])))
+        closed_vertices = self._simplified[1]
+        return closed_vertices if closed else closed_vertices[:-1]
+
+    def _absorb_envelope(self, env):
+        # only an envelope which keeps all of its points has references for its interior points
+        self.add_points(*env._export_points(all_points=env.keep_all))
+
+    def _engine_kwargs(self):
+        # keyword arguments of from_points which create an envelope with the same engine settings
+        return {}
+
+    def _export_points(self, all_points=False):
+        if all_points:
+            return self.points[:, 0], self.points[:, 1], self.refs.runs, self.refs.indices
+        return (self.envelope_x(closed=False),
+                self.envelope_y(closed=False),
+                self.envelope_runs(closed=False),
+                self.refs.indices[self.vertices])
+
+    def _invalidate_perimeter(self):
+        self._closed_vertices = None
+        self._perimeter = None
+        self._simplified = None
+
+    @staticmethod
+    def _query_points(x, y):
+        scalar = np.ndim(x) == 0
+        points = np.column_stack([np.ravel(x), np.ravel(y)]).astype(float)
+        return points, scalar
+
+    @staticmethod
+    def _read_only(arr):
+        arr.setflags(write=False)
+        return arr
+
+    def _segment_distances(self, points):
+        # unsigned distance to the nearest perimeter segment
+        perimeter = self.perimeter
+        starts = perimeter[:-1]
+        segments = perimeter[1:] - starts
+        lengths = (segments ** 2).sum(axis=1)
+        # bound the size of the (points, segments) temporaries for boundaries with many vertices
+        chunksize = max(1, min(self.QUERY_CHUNKSIZE, self.QUERY_CHUNKSIZE * 16 // len(segments)))
+        distance = np.empty(len(points))
+        for i in range(0, len(points), chunksize):
+            chunk = points[i:i + chunksize]
+            relative = chunk[:, np.newaxis, :] - starts
+            t = np.clip((relative * segments).sum(axis=2) / lengths, 0., 1.)
+            nearest = relative - t[:, :, np.newaxis] * segments
+            distance[i:i + chunksize] = np.sqrt((nearest ** 2).sum(axis=2).min(axis=1))
+        return distance
+
+    @staticmethod
+    def _stack_points(*args):
+        arrs = [np.array(x).reshape((len(x), 1)) for x in args]
+        return np.hstack(arrs)
@@ -0,0 +1,40 @@
+from ._alpha import AlphaEnvelope
+from ._envelope import Envelope
+from ._grid import GridEnvelope
+
+ENGINES = {'alpha': AlphaEnvelope,
+           'convex': Envelope,
+           'grid': GridEnvelope}
+"""
+The envelope classes by engine name. Additional engines can be registered by adding them here.
+"""
+
+
+def create_envelope(xname, yname, runs, *args, engine='convex', **kwargs):
+    """
+    Create an envelope of Runs with the given engine.
+
+    Parameters
+    ----------
+    xname: str
+        The name of the x data of the Runs.
+    yname: str
+        The name of the y data of the Runs.
+    runs: Run or list(Run)
+        The Runs to be enveloped.
+    engine: str, optional. Default='convex'.
+        The name of the engine within ENGINES.
+    *args
+        Variable length argument list to be passed to the envelope class constructor.
+    **kwargs
+        Arbitrary keyword arguments to be passed to the envelope class constructor.
+
+    Returns
+    -------
+    envelope: BaseEnvelope
+    """
+    try:
+        cls = ENGINES[engine]
+    except KeyError:
+        raise ValueError("Unknown envelope engine '%s', expected one of: %s" % (engine, ", ".join(sorted(ENGINES))))
+    return cls(xname, yname, runs, *args, **kwargs)
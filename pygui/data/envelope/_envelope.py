@@ -1,37 +1,33 @@
+import json
 import os
 import sys
+import warnings
 
-import collections
 import numpy as np
 
+from pandas import read_csv
 from scipy.spatial import ConvexHull
-from copy import deepcopy
 from uuid import uuid4
 
 SRC_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if SRC_DIR not in sys.path:
     sys.path.insert(0, SRC_DIR)
 
-from data import Run
+from data import Run, RunHandle
+from data._names import decode_name, encode_name
 from widget.plot import PickableAxes
 
-
-PointRef = collections.namedtuple('PointRef', ['run', 'index'])
+from ._base import BaseEnvelope, ExceedanceReport
+from ._filter import hull_candidates
+from ._refs import PointRef, PointRefArray
 
 # TODO: ADD ERROR CHECKING/HANDLING FOR ENVELOPES THAT HAVE DIFFERENT XNAMES/YNAMES
-# TODO: ADD PLOT HANDLING FOR ENVELOPE SETS
-
 
-class Envelope(ConvexHull):
 
-    def __init__(self, xname, yname, runs, *args, description="", incremental=True, name=None, keep_all=False, **kwargs):
-        self.xname = xname
-        self.yname = yname
-
-        self.name = name if name is not None else uuid4()
-        self.description = description
-        self.keep_all = keep_all
+class Envelope(BaseEnvelope, ConvexHull):
 
+    def __init__(self, xname, yname, runs, *args, description="", incremental=True, name=None, keep_all=False,
+                 max_points=None, prefilter=False, **kwargs):
         if not any(isinstance(runs, o) for o in (list, tuple)):
             runs = [runs]
 
@@ -39,121 +35,379 @@ class Envelope(ConvexHull):
             incremental = True
         run0 = runs[0]
         points0 = self._stack_points(run0[xname], run0[yname])
-        super().__init__(points0, *args, incremental=incremental, **kwargs)
-
-        self._refs = []
-        self._store_refs(run0)
+        self._initialize(xname, yname, points0, run0, run0.index, *args, description=description,
+                         incremental=incremental, name=name, keep_all=keep_all, max_points=max_points,
+                         prefilter=prefilter, **kwargs)
 
         for run in runs[1:]:
             self.add_run(run)
 
-    @property
-    def closed_vertices(self):
-        return np.hstack([self.vertices, [self.vertices[0]]])
-
-    @property
-    def perimeter(self):
-        return self.points[self.closed_vertices, :]
-
-    @property
-    def refs(self):
-        return self._refs
-
-    def absorb_envelopes(self, envelopes):
-        if not any(isinstance(envelopes, o) for o in (list, tuple)):
-            envelopes = [envelopes]
-        for env in envelopes:
-            self._absorb_envelope(env)
-
-    def add_points(self, x, y, parents, indices):
-        assert len(x) == len(y) == len(parents) == len(indices)
-        points = self._stack_points(x, y)
-        len0 = len(self.refs)
-        super(Envelope, self).add_points(points)
-        for i, (parent, index) in enumerate(zip(parents, indices)):
-            itotal = len0 + i
-            runref = parent if (itotal in self.vertices or self.keep_all) else None
-            iref = None if runref is None else index
-            self.refs.append(PointRef(run=runref, index=iref))
-
-    def add_run(self, run):
+    def add_run(self, run, report=False):
+        """
+        Add the data of a Run to the envelope.
+
+        Parameters
+        ----------
+        run: Run
+            The Run whose x, y data is added.
+        report: bool, optional. Default=False.
+            Report which rows of the Run lie outside of the envelope as it was before the Run was added.
+
+        Returns
+        -------
+        report: ExceedanceReport or None
+            The exceedance report if requested, otherwise None.
+        """
         x = run[self.xname]
         y = run[self.yname]
         points = self._stack_points(x, y)
-        vertices0 = self.vertices.copy()
-        super(Envelope, self).add_points(points)
-        self._store_refs(run)
-        if not self.keep_all:
-            self._clean_refs(vertices0)
+        if not report:
+            self._add_batch(points, run, run.index)
+            return None
+
+        distances = self._facet_distances(points)
+        outside = np.flatnonzero(distances > 0.)
+        distances = self._segment_distances(points[outside])
+        indices = np.asarray(run.index)[outside]
+        if self.prefilter and not self.keep_all:
+            # rows inside the prior envelope can not become vertices
+            self._add_batch(points[outside], run, indices)
+        else:
+            self._add_batch(points, run, run.index)
+        max_distance = distances.max() if len(distances) else 0.
+        return ExceedanceReport(run=run, indices=indices, distances=distances, max_distance=max_distance)
+
+    def compact(self):
+        """
+        Rebuild the hull from its current vertices, discarding all interior points.
+
+        Only available when keep_all is False. The run/index references of the vertices
+        are preserved.
+        """
+        if self.keep_all:
+            raise ValueError("Cannot compact an Envelope which keeps all points.")
+        self._rebuild(np.empty((0, 2)), [], [])
+
+    def contains(self, x, y, tolerance=0.):
+        """
+        Test whether points lie inside the envelope.
+
+        Parameters
+        ----------
+        x: float or array_like
+            The x data of the points.
+        y: float or array_like
+            The y data of the points.
+        tolerance: float, optional. Default=0.
+            Points up to this distance outside of the envelope are considered to be inside it.
+
+        Returns
+        -------
+        inside: bool or numpy.array(bool)
+        """
+        points, scalar = self._query_points(x, y)
+        distance = self._facet_distances(points)
+        inside = distance <= 0.
+        # the facet distance is a lower bound of the distance outside, it is exact only beside a facet
+        near = ~inside & (distance <= tolerance)
+        if np.any(near):
+            inside[near] = self._segment_distances(points[near]) <= tolerance
+        return inside[0] if scalar else inside
+
+    def distance_to_boundary(self, x, y):
+        """
+        Get the signed distance from points to the envelope boundary.
+
+        Parameters
+        ----------
+        x: float or array_like
+            The x data of the points.
+        y: float or array_like
+            The y data of the points.
+
+        Returns
+        -------
+        distance: float or numpy.array(float)
+            The distance to the nearest point of the boundary. Positive outside of the
+            envelope and negative inside of it.
+        """
+        points, scalar = self._query_points(x, y)
+        distance = self._facet_distances(points)
+        # inside, the distance to the nearest facet line is exact. outside, the nearest boundary point may be a vertex
+        outside = distance > 0.
+        if np.any(outside):
+            distance[outside] = self._segment_distances(points[outside])
+        return distance[0] if scalar else distance
+
+    @classmethod
+    def from_file(cls, xname, yname, filepath, *args, name=None, description="", run_name=None, run_description="",
+                  run_kwargs={}, chunksize=None, cache=None, **kwargs):
+        use_cache = cache is not None and not kwargs.get('keep_all', False)
+        if use_cache:
+            vertices = cache.get(filepath, xname, yname, **run_kwargs)
+            if vertices is not None:
+                x, y, indices = vertices
+                handle = RunHandle(filepath, name=run_name, description=run_description, **run_kwargs)
+                return cls.from_points(xname, yname, x, y, handle, indices, *args, name=name,
+                                       description=description, **kwargs)
+
+        if chunksize is None:
+            run = Run.read_csv(filepath, name=run_name, description=run_description, **run_kwargs)
+            env = cls(xname, yname, run, *args, name=name, description=description, **kwargs)
+        else:
+            env = cls._from_chunks(xname, yname, filepath, chunksize, *args, name=name, description=description,
+                                   run_name=run_name, run_description=run_description, run_kwargs=run_kwargs,
+                                   **kwargs)
 
-    def envelope_indices(self, closed=False):
-        vertices = self.closed_vertices if closed else self.vertices
-        return [self.refs[vertex].index for vertex in vertices]
+        if use_cache:
+            cache.put(filepath, xname, yname, env.envelope_x(), env.envelope_y(), env.envelope_indices(),
+                      **run_kwargs)
+        return env
 
-    def envelope_refs(self, closed=False):
-        for run, index in zip(self.envelope_runs(closed=closed), self.envelope_indices(closed=closed)):
-            yield run, index
+    @classmethod
+    def from_points(cls, xname, yname, x, y, parents, indices, *args, description="", incremental=True, name=None,
+                    keep_all=False, max_points=None, prefilter=False, **kwargs):
+        env = cls.__new__(cls)
+        env._initialize(xname, yname, cls._stack_points(x, y), parents, indices, *args, description=description,
+                        incremental=incremental, name=name, keep_all=keep_all, max_points=max_points,
+                        prefilter=prefilter, **kwargs)
+        return env
 
-    def envelope_runs(self, closed=False):
-        vertices = self.closed_vertices if closed else self.vertices
-        return [self.refs[vertex].run for vertex in vertices]
+    @classmethod
+    def load(cls, filepath, runs=None, run_kwargs={}):
+        """
+        Load an envelope saved by Envelope.save.
+
+        Parameters
+        ----------
+        filepath: str
+            The file to be loaded.
+        runs: dict or None, optional. Default=None.
+            Runs to be attached to the envelope, keyed by Run name. Any other run which was read
+            from file is attached as a RunHandle, so it is only read in when its data is accessed.
+        run_kwargs: dict, optional. Default={}.
+            Keyword arguments to be passed into Run.read_csv when a RunHandle without its own read
+            keyword arguments is loaded.
+
+        Returns
+        -------
+        envelope: Envelope
+
+        Notes
+        -----
+        .. [1] References to runs which are neither given nor were read from file are lost.
+        """
+        with np.load(filepath, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].item())
+            points = data['points']
+            run_ids = data['run_ids']
+            indices = data['indices']
+        table = [cls._attach_run(info, runs, run_kwargs) for info in meta['runs']]
+
+        # the saved points are restored as they were, compaction and filtering only apply to later points
+        env = cls.from_points(meta['xname'], meta['yname'], points[:, 0], points[:, 1], None, indices,
+                              name=decode_name(meta['name']), description=meta['description'],
+                              keep_all=meta['keep_all'], **meta['hull_kwargs'])
+        env._refs = PointRefArray.from_arrays(table, run_ids, indices)
+        if not env.keep_all:
+            env._clean_refs(np.arange(env.npoints))
+        env.max_points = meta['max_points']
+        env.prefilter = meta['prefilter']
+        return env
+
+    def save(self, filepath):
+        """
+        Save the envelope to a compact NPZ file.
+
+        Only the points of the envelope and their references are stored. Runs are stored by their
+        name and file path rather than their data. When keep_all is False, only the vertices are stored.
+
+        Parameters
+        ----------
+        filepath: str
+            The file to be written. The .npz extension is appended if not present.
+
+        Raises
+        ------
+        ValueError
+            If the run indices are not numeric, or a name is neither a str, int, float nor UUID, so it
+            cannot be restored by load.
+        """
+        positions = np.arange(self.npoints) if self.keep_all else self.vertices
+        indices = self.refs.indices[positions]
+        if indices.dtype == object:
+            raise ValueError("Cannot save an Envelope with non-numeric run indices.")
+        meta = {'xname': self.xname,
+                'yname': self.yname,
+                'name': encode_name(self.name),
+                'description': self.description,
+                'keep_all': self.keep_all,
+                'max_points': self.max_points,
+                'prefilter': self.prefilter,
+                'hull_kwargs': self._hull_kwargs,
+                'runs': [self._describe_run(run) for run in self.refs.run_table]}
+        np.savez(filepath, meta=np.array(json.dumps(meta)), points=self.points[positions],
+                 run_ids=self.refs.run_ids[positions], indices=indices)
+
+    def _add_batch(self, points, parents, indices):
+        points, parents, indices = self._filter_batch(points, parents, indices)
+        if self._needs_compaction(len(points)):
+            self._rebuild(points, parents, indices)
+        else:
+            vertices0 = self.vertices.copy()
+            ConvexHull.add_points(self, points)
+            self._invalidate_perimeter()
+            self._store_refs(parents, indices)
+            if not self.keep_all:
+                self._clean_refs(vertices0)
 
-    def envelope_x(self, closed=False):
-        v = self.closed_vertices if closed else self.vertices
-        return self.points[v, 0]
+    @staticmethod
+    def _attach_run(info, runs, run_kwargs):
+        name = decode_name(info['name'])
+        if runs is not None and name in runs:
+            return runs[name]
+        if info['filepath'] is None:
+            return None
+        kwargs = info['read_kwargs'] or run_kwargs
+        return RunHandle(info['filepath'], name=name, description=info['description'], **kwargs)
 
-    def envelope_y(self, closed=False):
-        v = self.closed_vertices if closed else self.vertices
-        return self.points[v, 1]
+    @staticmethod
+    def _describe_run(run):
+        filepath = getattr(run, 'filepath', None)
+        read_kwargs = getattr(run, 'read_kwargs', {})
+        try:
+            json.dumps(read_kwargs)
+        except (TypeError, ValueError):
+            warnings.warn("The read keyword arguments of Run %s cannot be saved, run_kwargs will be used when the "
+                          "Envelope is loaded." % getattr(run, 'name', None))
+            read_kwargs = None
+        return {'name': encode_name(getattr(run, 'name', None)),
+                'description': getattr(run, 'description', ""),
+                'filepath': None if filepath is None else os.path.abspath(filepath),
+                'read_kwargs': read_kwargs}
+
+    def _facet_distances(self, points):
+        # signed distance to the furthest facet line, the facet normals are outward facing unit vectors
+        normals = self.equations[:, :2].T
+        offsets = self.equations[:, 2]
+        distance = np.empty(len(points))
+        for i in range(0, len(points), self.QUERY_CHUNKSIZE):
+            chunk = points[i:i + self.QUERY_CHUNKSIZE]
+            distance[i:i + self.QUERY_CHUNKSIZE] = (chunk @ normals + offsets).max(axis=1)
+        return distance
+
+    def _filter_batch(self, points, parents, indices):
+        if self.keep_all or not self.prefilter:
+            return points, parents, indices
+        candidates = hull_candidates(points)
+        if any(isinstance(parents, o) for o in (list, tuple, np.ndarray)):
+            parents = [parents[i] for i in candidates]
+        return points[candidates], parents, np.asarray(indices)[candidates]
+
+    def _engine_kwargs(self):
+        return {'keep_all': self.keep_all}
 
     @classmethod
-    def from_file(cls, xname, yname, filepath, *args, name=None, description="", run_name=None, run_description="", run_kwargs={}, **kwargs):
-        run = Run.read_csv(filepath, name=run_name, description=run_description, **run_kwargs)
-        return Envelope(xname, yname, run, *args, name=name, description=description, **kwargs)
+    def _from_chunks(cls, xname, yname, filepath, chunksize, *args, name=None, description="", run_name=None,
+                     run_description="", run_kwargs={}, **kwargs):
+        # stream the file, only keeping the points of each chunk which lie on the chunk's own hull
+        handle = RunHandle(filepath, name=run_name, description=run_description, **run_kwargs)
+        keep_all = kwargs.get('keep_all', False)
+        env = None
+        # the candidates of the leading chunks are buffered until they can form a hull
+        buffered_points = []
+        buffered_indices = []
+        for chunk in cls._read_chunks(xname, yname, filepath, chunksize, run_kwargs):
+            points = cls._stack_points(chunk[xname], chunk[yname])
+            candidates = np.arange(len(points)) if keep_all else hull_candidates(points)
+            indices = np.asarray(chunk.index)[candidates]
+            if env is not None:
+                env._add_batch(points[candidates], handle, indices)
+                continue
+            buffered_points.append(points[candidates])
+            buffered_indices.append(indices)
+            points = np.vstack(buffered_points)
+            if cls._spans_plane(points):
+                env = cls.from_points(xname, yname, points[:, 0], points[:, 1], handle,
+                                      np.concatenate(buffered_indices), *args, name=name, description=description,
+                                      **kwargs)
+                buffered_points = buffered_indices = None
+
+        if env is None:
+            if not buffered_points:
+                raise ValueError("Cannot create an envelope from %s, the file has no data." % filepath)
+            raise ValueError("Cannot create an envelope from %s, its %s, %s data has fewer than 3 points or all of "
+                             "its points lie on a line." % (filepath, xname, yname))
+        return env
+
+    def _initialize(self, xname, yname, points, parents, indices, *args, description="", incremental=True, name=None,
+                    keep_all=False, max_points=None, prefilter=False, **kwargs):
+        self.xname = xname
+        self.yname = yname
 
-    def get_run_data(self, names, closed=False):
-        if isinstance(names, str):
-            names = [names]
-        return [run[names].iloc[i] for run, i in self.envelope_refs(closed=closed)]
+        self.name = name if name is not None else uuid4()
+        self.description = description
+        self.keep_all = keep_all
+        self.max_points = max_points
+        self.prefilter = prefilter
 
-    def plot(self, ax, *args, **kwargs):
-        if isinstance(ax, PickableAxes):
-            parents = list(self.envelope_runs(closed=True))
-            indices = list(self.envelope_indices(closed=True))
-            ax.plot(self.perimeter[:, 0], self.perimeter[:, 1], parent=parents, indices=indices, *args, **kwargs)
-        else:
-            ax.plot(self.perimeter[:, 0], self.perimeter[:, 1], *args, **kwargs)
+        points, parents, indices = self._filter_batch(points, parents, indices)
+        ConvexHull.__init__(self, points, *args, incremental=incremental, **kwargs)
+        self._invalidate_perimeter()
+        self._hull_args = args
+        self._hull_kwargs = dict(kwargs, incremental=incremental)
 
-    def _absorb_envelope(self, env):
-        if self.keep_all:
-            x = env.points[:, 0]
-            y = env.points[:, 1]
-            parents = [ref.run for ref in env.refs]
-            indices = [ref.index for ref in env.refs]
-        else:
-            x = env.points[env.vertices, 0]
-            y = env.points[env.vertices, 1]
-            parents = list(env.envelope_runs(closed=False))
-            indices = list(env.envelope_indices(closed=False))
-        self.add_points(x, y, parents, indices)
+        self._refs = PointRefArray()
+        self._store_refs(parents, indices)
+        if self._needs_compaction():
+            self.compact()
 
     def _clean_refs(self, indices):
-        for index in indices:
-            if index not in self.vertices:
-                self.refs[index] = PointRef(run=None, index=None)
+        self.refs.clear(np.setdiff1d(indices, self.vertices))
+        # release the runs which no longer own a vertex
+        self.refs.prune()
+
+    def _needs_compaction(self, npending=0):
+        return not self.keep_all and self.max_points is not None and self.npoints + npending > self.max_points
+
+    def _rebuild(self, points, parents, indices):
+        vertices = self.vertices.copy()
+        points = np.vstack([self.points[vertices], points])
+        self.refs.compact(vertices)
+        self.close()
+        ConvexHull.__init__(self, points, *self._hull_args, **self._hull_kwargs)
+        self._invalidate_perimeter()
+        self._store_refs(parents, indices)
+        self._clean_refs(np.arange(len(vertices)))
 
     @staticmethod
-    def _stack_points(*args):
-        arrs = [np.array(x).reshape((len(x), 1)) for x in args]
-        return np.hstack(arrs)
+    def _spans_plane(points):
+        # at least 3 points which do not all lie on a line, as required to form a hull
+        return len(points) >= 3 and np.linalg.matrix_rank(points - points[0]) == 2
 
-    def _store_refs(self, run):
-        len0 = len(self.refs)
-        for i in range(run.shape[0]):
-            itotal = len0 + i
-            runref = run if (itotal in self.vertices or self.keep_all) else None
-            iref = None if runref is None else run.index[i]
-            self.refs.append(PointRef(run=runref, index=iref))
+    @staticmethod
+    def _read_chunks(xname, yname, filepath, chunksize, run_kwargs):
+        kwargs = dict(run_kwargs)
+        usecols = [xname, yname]
+        index_col = kwargs.get('index_col', None)
+        if isinstance(index_col, str):
+            usecols.append(index_col)
+        elif index_col is not None:
+            # positional index columns refer to the full file, so the file columns cannot be restricted
+            usecols = None
+        kwargs['usecols'] = usecols
+        kwargs['chunksize'] = chunksize
+        with read_csv(filepath, **kwargs) as reader:
+            for chunk in reader:
+                yield chunk
+
+    def _store_refs(self, parents, indices):
+        if self.keep_all:
+            keep = None
+        else:
+            len0 = len(self.refs)
+            keep = self.vertices[self.vertices >= len0] - len0
+        self.refs.extend(parents, indices, keep=keep)
 
 
 class EnvelopeSet(object):
@@ -163,23 +417,120 @@ class EnvelopeSet(object):
         self.name = name if name is not None else uuid4()
         self.description = description
 
+        # the full envelope is computed on first access, along with the member which contributed each of its points
         self._full_envelope = None
-        self._initialize_full_envelope()
+        self._sources = None
 
     @property
     def full_envelope(self):
+        # None for an empty set
+        if self._full_envelope is None and self.envelopes:
+            self._initialize_full_envelope()
         return self._full_envelope
 
     def add_envelopes(self, envelopes):
         if not any(isinstance(envelopes, o) for o in (list, tuple)):
-            envelopes = envelopes
+            envelopes = [envelopes]
 
-        self.full_envelope.absorb_envelopes(envelopes)
+        for env in envelopes:
+            self.envelopes.append(env)
+            if self._full_envelope is not None:
+                self._absorb_member(len(self.envelopes) - 1)
+
+    def envelope_sources(self, closed=False):
+        """
+        Get the member envelope which contributes each vertex of the full envelope.
+
+        Parameters
+        ----------
+        closed: bool, optional. Default=False.
+            Repeat the first vertex at the end.
+
+        Returns
+        -------
+        envelopes: list(Envelope or None)
+            None for a vertex whose member has since been removed.
+        """
+        full = self.full_envelope
+        if full is None:
+            return []
+        vertices = full.closed_vertices if closed else full.vertices
+        # -1 marks the points of removed members
+        return [self.envelopes[i] if i >= 0 else None for i in self._sources[vertices]]
+
+    def plot(self, ax, *args, tolerance=None, full=False, **kwargs):
+        """
+        Overlay the perimeters of the member envelopes.
+
+        On a plain axes, the members are drawn as a single line broken by NaN's so that overlays
+        of many envelopes redraw quickly. On a PickableAxes, each member is drawn separately so
+        its vertices are linked to their runs.
+
+        Parameters
+        ----------
+        ax: matplotlib.axes.Axes
+            The axes to plot on.
+        tolerance: float or None, optional. Default=None.
+            Plot the perimeters simplified to within this distance. See Envelope.simplified_vertices.
+        full: bool, optional. Default=False.
+            Also plot the full envelope as a separate line.
+        *args
+            Variable length argument list to be passed into the axes plot function.
+        **kwargs
+            Arbitrary keyword arguments to be passed into the axes plot function.
+        """
+        if isinstance(ax, PickableAxes):
+            for env in self.envelopes:
+                env.plot(ax, *args, tolerance=tolerance, **kwargs)
+        elif self.envelopes:
+            gap = np.full((1, 2), np.nan)
+            segments = []
+            for env in self.envelopes:
+                vertices = env.closed_vertices if tolerance is None else env.simplified_vertices(tolerance, closed=True)
+                segments.extend([env.points[vertices], gap])
+            points = np.vstack(segments[:-1])
+            ax.plot(points[:, 0], points[:, 1], *args, **kwargs)
+        if full and self.envelopes:
+            self.full_envelope.plot(ax, *args, tolerance=tolerance, **kwargs)
+
+    def remove_envelopes(self, envelopes):
+        if not any(isinstance(envelopes, o) for o in (list, tuple)):
+            envelopes = [envelopes]
 
-    def _initialize_full_envelope(self):
-        env0 = deepcopy(self.envelopes[0])
-        env0.name = self.name
-        env0.description = self.description
+        for env in envelopes:
+            i = next((i for i, member in enumerate(self.envelopes) if member is env), None)
+            if i is None:
+                warnings.warn("Attempted to remove Envelope %s from EnvelopeSet %s but the envelope was not found." %
+                              (env.name, self.name))
+                continue
+            del self.envelopes[i]
+            if self._full_envelope is None:
+                continue
+            full = self._full_envelope
+            # only a convex hull is unchanged by removing interior points, other engines may keep the removed points'
+            # cells or edges, and a later member may turn them into vertices
+            if type(full) is not Envelope or full.keep_all or np.any(self._sources[full.vertices] == i):
+                # the removed envelope shaped the full envelope, it must be recomputed
+                self._full_envelope = None
+                self._sources = None
+            else:
+                # the full envelope is unchanged, its interior points from the removed envelope are orphaned
+                self._sources[self._sources == i] = -1
+                self._sources[self._sources > i] -= 1
+
+    def _absorb_member(self, i):
+        full = self._full_envelope
+        npoints = full.npoints
+        full.absorb_envelopes(self.envelopes[i])
+        self._sources = np.concatenate([self._sources, np.full(full.npoints - npoints, i)])
 
-        env0.absorb_envelopes(self.envelopes[1:])
-        self._full_envelope = env0
+    def _initialize_full_envelope(self):
+        # build from the member envelopes' points directly, the referenced runs are shared rather than copied.
+        # members are absorbed one at a time since an engine may not keep every point it is given
+        env0 = self.envelopes[0]
+        x, y, parents, indices = env0._export_points(all_points=env0.keep_all)
+        self._full_envelope = type(env0).from_points(env0.xname, env0.yname, x, y, parents, indices, name=self.name,
+                                                     description=self.description, **env0._engine_kwargs())
+        self._sources = np.zeros(self._full_envelope.npoints, dtype=int)
+        for i in range(1, len(self.envelopes)):
+            self._absorb_member(i)
@@ -0,0 +1,77 @@
+import numpy as np
+
+from scipy.spatial import ConvexHull, QhullError
+
+
+# directions in counter-clockwise order whose extreme points form the Akl-Toussaint octagon
+OCTAGON_DIRECTIONS = np.array([[0., -1.],
+                               [1., -1.],
+                               [1., 0.],
+                               [1., 1.],
+                               [0., 1.],
+                               [-1., 1.],
+                               [-1., 0.],
+                               [-1., -1.]])
+
+
+def akl_toussaint(points):
+    """
+    Discard the points which lie strictly inside the octagon formed by the extreme points.
+
+    Parameters
+    ----------
+    points: numpy.array (ndim=2)
+        An (n, 2) array of x, y coordinates.
+
+    Returns
+    -------
+    candidates: numpy.array(int)
+        The positions of the points which may lie on the convex hull.
+    """
+    n = len(points)
+    if n < 9:
+        return np.arange(n)
+
+    extremes = np.argmax(points @ OCTAGON_DIRECTIONS.T, axis=0)
+    # an extreme point may be extreme in several consecutive directions
+    extremes = extremes[np.append(True, extremes[1:] != extremes[:-1])]
+    if len(extremes) > 1 and extremes[0] == extremes[-1]:
+        extremes = extremes[:-1]
+    if len(extremes) < 3:
+        return np.arange(n)
+
+    corners = points[extremes]
+    edges = np.roll(corners, -1, axis=0) - corners
+    scale = np.abs(points).max()
+    tolerance = np.finfo(float).eps * 64 * scale * scale
+
+    inside = np.ones(n, dtype=bool)
+    for corner, edge in zip(corners, edges):
+        cross = edge[0] * (points[:, 1] - corner[1]) - edge[1] * (points[:, 0] - corner[0])
+        inside &= cross > tolerance
+    return np.flatnonzero(~inside)
+
+
+def hull_candidates(points):
+    """
+    Reduce a batch of points to those which can be vertices of any hull that contains them.
+
+    The batch is first culled with the Akl-Toussaint heuristic and the survivors are then
+    reduced to the vertices of their own convex hull.
+
+    Parameters
+    ----------
+    points: numpy.array (ndim=2)
+        An (n, 2) array of x, y coordinates.
+
+    Returns
+    -------
+    candidates: numpy.array(int)
+        The positions of the candidate points within the batch.
+    """
+    candidates = akl_toussaint(points)
+    try:
+        return candidates[ConvexHull(points[candidates]).vertices]
+    except (QhullError, ValueError):
+        # too few or degenerate points to form a hull, all of them are candidates
+        return candidates
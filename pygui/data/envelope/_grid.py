@@ -0,0 +1,202 @@
+import warnings
+
+import numpy as np
+
+from uuid import uuid4
+
+from ._base import BaseEnvelope
+from ._polygon import boundary_rings, signed_area
+from ._refs import PointRefArray
+
+
+class GridEnvelope(BaseEnvelope):
+    """
+    An envelope accumulated in a fixed resolution occupancy grid.
+
+    The x, y plane within xlim and ylim is divided into a grid of cells. Adding points only marks
+    the cells they fall in as occupied and keeps the first point seen in each newly occupied cell
+    along with its reference, so the cost of adding points does not depend on the number of points
+    already added and the memory is bounded by the grid. Envelopes on the same grid are merged
+    with a bitwise OR of their occupancy.
+
+    The envelope is traced along the outline of the largest region of occupied cells, through the
+    first point seen in each cell on the outline.
+
+    Parameters
+    ----------
+    xname: str
+        The name of the x data of the Runs.
+    yname: str
+        The name of the y data of the Runs.
+    runs: Run or list(Run)
+        The Runs to be enveloped.
+    xlim: tuple(float, float)
+        The lower and upper limit of the x data covered by the grid.
+    ylim: tuple(float, float)
+        The lower and upper limit of the y data covered by the grid.
+    shape: tuple(int, int), optional. Default=(512, 512).
+        The number of cells of the grid in x and y.
+    description: str, optional. Default="".
+        Additional details about the envelope to be used in reports, etc.
+    name: str or None, optional. Default=None.
+        Identifying name for the envelope. If a name is not provided, a unique ID is generated.
+
+    Notes
+    -----
+    .. [1] Points outside of the grid limits are ignored with a warning.
+    .. [2] Holes and regions which are disconnected from the largest region are not part of the
+           envelope. Cells which only touch at a corner are not connected.
+    """
+
+    DEFAULT_SHAPE = (512, 512)
+
+    keep_all = False
+
+    def __init__(self, xname, yname, runs, xlim, ylim, shape=DEFAULT_SHAPE, description="", name=None):
+        if not any(isinstance(runs, o) for o in (list, tuple)):
+            runs = [runs]
+
+        self._initialize(xname, yname, xlim, ylim, shape=shape, description=description, name=name)
+        for run in runs:
+            self.add_run(run)
+
+    @property
+    def npoints(self):
+        return len(self.refs)
+
+    @property
+    def occupancy(self):
+        return (self._cell_points >= 0).reshape(self.shape)
+
+    @property
+    def points(self):
+        if len(self._batches) != 1:
+            self._batches = [np.vstack(self._batches) if self._batches else np.empty((0, 2))]
+        return self._batches[0]
+
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self._vertices = self._trace_outline()
+        return self._vertices
+
+    @classmethod
+    def from_points(cls, xname, yname, x, y, parents, indices, xlim, ylim, shape=DEFAULT_SHAPE, description="",
+                    name=None):
+        env = cls.__new__(cls)
+        env._initialize(xname, yname, xlim, ylim, shape=shape, description=description, name=name)
+        env.add_points(x, y, parents, indices)
+        return env
+
+    def _absorb_envelope(self, env):
+        if isinstance(env, GridEnvelope) and env._engine_kwargs() == self._engine_kwargs():
+            self._merge_grid(env)
+        else:
+            self.add_points(*env._export_points(all_points=True))
+
+    def _add_batch(self, points, parents, indices):
+        cells = self._locate_cells(points)
+        inside = np.flatnonzero(cells >= 0)
+        if len(inside) < len(cells):
+            warnings.warn("%d points outside of the limits of GridEnvelope %s were ignored." %
+                          (len(cells) - len(inside), self.name))
+
+        occupied = np.bincount(cells[inside], minlength=self._cell_points.size) > 0
+        new = occupied & (self._cell_points < 0)
+        if not np.any(new):
+            return
+        # the first point of the batch in each newly occupied cell, in the order they were seen
+        rows = inside[new[cells[inside]]]
+        _, first = np.unique(cells[rows], return_index=True)
+        rows = np.sort(rows[first])
+
+        if any(isinstance(parents, o) for o in (list, tuple, np.ndarray)):
+            parents = [parents[i] for i in rows]
+        self._store_cells(cells[rows], points[rows], parents, np.asarray(indices)[rows])
+
+    def _engine_kwargs(self):
+        return {'xlim': self.xlim, 'ylim': self.ylim, 'shape': self.shape}
+
+    def _export_points(self, all_points=False):
+        # the first point of every occupied cell is needed to reproduce the occupancy
+        return super()._export_points(all_points=True)
+
+    def _initialize(self, xname, yname, xlim, ylim, shape=DEFAULT_SHAPE, description="", name=None):
+        self.xname = xname
+        self.yname = yname
+
+        self.name = name if name is not None else uuid4()
+        self.description = description
+        self.xlim = tuple(float(v) for v in xlim)
+        self.ylim = tuple(float(v) for v in ylim)
+        self.shape = tuple(int(n) for n in shape)
+
+        # the position within points of the first point seen in each cell, -1 for unoccupied cells
+        self._cell_points = np.full(self.shape[0] * self.shape[1], -1, dtype=np.int64)
+        self._batches = []
+        self._refs = PointRefArray()
+        self._vertices = None
+        self._invalidate_perimeter()
+
+    def _locate_cells(self, points):
+        # the flat index of the cell of each point, -1 for points outside of the grid
+        nx, ny = self.shape
+        x = (points[:, 0] - self.xlim[0]) / (self.xlim[1] - self.xlim[0]) * nx
+        y = (points[:, 1] - self.ylim[0]) / (self.ylim[1] - self.ylim[0]) * ny
+        inside = (x >= 0.) & (x <= nx) & (y >= 0.) & (y <= ny)
+        cells = np.full(len(points), -1, dtype=np.int64)
+        # points on the upper limits belong to the last cells
+        ix = np.minimum(x[inside].astype(np.int64), nx - 1)
+        iy = np.minimum(y[inside].astype(np.int64), ny - 1)
+        cells[inside] = ix * ny + iy
+        return cells
+
+    def _merge_grid(self, env):
+        # cells which are occupied in env but not in self, i.e. the bits added by an OR of the occupancies
+        cells = np.flatnonzero(env.occupancy.ravel() & ~self.occupancy.ravel())
+        if not len(cells):
+            return
+        positions = env._cell_points[cells]
+        order = np.argsort(positions)
+        cells = cells[order]
+        positions = positions[order]
+        self._store_cells(cells, env.points[positions], env.refs.get_runs(positions), env.refs.indices[positions])
+
+    def _store_cells(self, cells, points, parents, indices):
+        self._cell_points[cells] = np.arange(self.npoints, self.npoints + len(cells))
+        self._batches.append(np.asarray(points, dtype=float))
+        self.refs.extend(parents, indices)
+        self._vertices = None
+        self._invalidate_perimeter()
+
+    def _trace_outline(self):
+        nx, ny = self.shape
+        occupied = np.pad(self.occupancy, 1)
+        cells = occupied[1:-1, 1:-1]
+        ix, iy = np.indices(self.shape)
+
+        # the counter-clockwise edges of occupied cells which border an unoccupied cell, as corner ids
+        def corner(i, j):
+            return i * (ny + 1) + j
+
+        sides = [(cells & ~occupied[1:-1, :-2], corner(ix, iy), corner(ix + 1, iy)),
+                 (cells & ~occupied[2:, 1:-1], corner(ix + 1, iy), corner(ix + 1, iy + 1)),
+                 (cells & ~occupied[1:-1, 2:], corner(ix + 1, iy + 1), corner(ix, iy + 1)),
+                 (cells & ~occupied[:-2, 1:-1], corner(ix, iy + 1), corner(ix, iy))]
+        edges = np.vstack([np.column_stack([start[border], end[border]]) for border, start, end in sides])
+        edge_cells = np.concatenate([(ix * ny + iy)[border] for border, _, _ in sides])
+        if not len(edges):
+            raise ValueError("GridEnvelope %s has no points within its limits." % self.name)
+
+        rings = boundary_rings(edges)
+        corners = np.column_stack(np.divmod(np.arange((nx + 1) * (ny + 1)), ny + 1)).astype(float)
+        ring = max(rings, key=lambda r: signed_area(corners[r]))
+
+        # trace through the cell bordered by the edge starting at each corner of the ring
+        corner_cells = np.full((nx + 1) * (ny + 1), -1, dtype=np.int64)
+        corner_cells[edges[:, 0]] = edge_cells
+        ring_cells = corner_cells[ring]
+        keep = ring_cells != np.roll(ring_cells, 1)
+        if not np.any(keep):
+            keep[0] = True
+        return self._cell_points[ring_cells[keep]]
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def boundary_rings(edges):
+    """
+    Chain the directed boundary edges of a region into closed rings.
+
+    Parameters
+    ----------
+    edges: numpy.array(int) (ndim=2)
+        An (n, 2) array of the (start, end) point positions of each edge. Every point must
+        start as many edges as it ends, as is the case for the boundary of a union of cells.
+
+    Returns
+    -------
+    rings: list(numpy.array(int))
+        The point positions of each ring, in order and without repeating the first point.
+    """
+    successors = {}
+    for start, end in edges.tolist():
+        successors.setdefault(start, []).append(end)
+
+    rings = []
+    while successors:
+        first = next(iter(successors))
+        ring = [first]
+        current = first
+        while True:
+            ends = successors[current]
+            end = ends.pop()
+            if not ends:
+                del successors[current]
+            if end == first:
+                break
+            ring.append(end)
+            current = end
+        rings.append(np.array(ring))
+    return rings
+
+
+def signed_area(points):
+    """
+    Get the area of a polygon by the shoelace formula.
+
+    Parameters
+    ----------
+    points: numpy.array (ndim=2)
+        An (n, 2) array of the x, y coordinates of the polygon vertices, in order and without
+        repeating the first vertex.
+
+    Returns
+    -------
+    area: float
+        Positive for counter-clockwise polygons and negative for clockwise ones.
+    """
+    x = points[:, 0]
+    y = points[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
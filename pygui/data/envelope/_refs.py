@@ -0,0 +1,208 @@
+import collections
+import numpy as np
+
+
+PointRef = collections.namedtuple('PointRef', ['run', 'index'])
+
+
+class PointRefArray(object):
+    """
+    Columnar storage of the (run, index) reference for every point of an Envelope.
+
+    Each point is stored as an integer id into a small table of runs plus the index
+    of the point within that run. Points without a reference are given a run id of -1
+    and are reported as (None, None), which mirrors the behavior of the original list
+    of PointRef's.
+    """
+
+    INITIAL_CAPACITY = 64
+
+    NO_RUN = -1
+
+    def __init__(self):
+        self._size = 0
+        self._run_ids = np.full(self.INITIAL_CAPACITY, self.NO_RUN, dtype=np.int32)
+        self._indices = np.zeros(self.INITIAL_CAPACITY, dtype=np.int64)
+
+        self._run_table = []
+        self._run_lookup = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the lookup is keyed by object id, which does not survive pickling
+        del state['_run_lookup']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._run_lookup = {id(run): i for i, run in enumerate(self._run_table)}
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError("PointRefArray index out of range")
+        run_id = self._run_ids[i]
+        if run_id == self.NO_RUN:
+            return PointRef(run=None, index=None)
+        return PointRef(run=self._run_table[run_id], index=self._as_scalar(self._indices[i]))
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def indices(self):
+        return self._indices[:self._size]
+
+    @property
+    def run_ids(self):
+        return self._run_ids[:self._size]
+
+    @property
+    def run_table(self):
+        return tuple(self._run_table)
+
+    @property
+    def runs(self):
+        table = np.empty(len(self._run_table) + 1, dtype=object)
+        for i, run in enumerate(self._run_table):
+            table[i] = run
+        # run id -1 wraps around to the trailing None entry
+        return table[self.run_ids]
+
+    @classmethod
+    def from_arrays(cls, run_table, run_ids, indices):
+        """
+        Create the references from a table of runs and the run id and index of every point.
+
+        Parameters
+        ----------
+        run_table: list(object)
+            The runs referred to by the run ids. None entries are treated as no reference.
+        run_ids: array_like(int)
+            The position within the run table of each point's run, or -1 for no reference.
+        indices: array_like
+            The index within its run of each point.
+        """
+        refs = cls()
+        indices = np.asarray(indices)
+        n = len(indices)
+        if n == 0:
+            return refs
+        mapping = np.array([refs._lookup_run(run) for run in run_table] + [cls.NO_RUN], dtype=np.int32)
+        start = refs._reserve(n, indices.dtype)
+        # run id -1 wraps around to the trailing NO_RUN entry
+        refs._run_ids[start:start + n] = mapping[np.asarray(run_ids, dtype=np.intp)]
+        refs._indices[start:start + n] = indices
+        return refs
+
+    def get_indices(self, positions):
+        return [self._as_scalar(i) for i in self.indices[positions]]
+
+    def get_runs(self, positions):
+        return [None if i == self.NO_RUN else self._run_table[i] for i in self.run_ids[positions]]
+
+    def clear(self, positions):
+        self._run_ids[np.asarray(positions, dtype=np.intp)] = self.NO_RUN
+
+    def compact(self, positions):
+        """
+        Discard all references except those at the given positions, in the given order.
+
+        Runs which are no longer referenced are removed from the run table.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        capacity = max(self.INITIAL_CAPACITY, 2 * len(positions))
+        run_ids = np.full(capacity, self.NO_RUN, dtype=np.int32)
+        indices = np.zeros(capacity, dtype=self._indices.dtype)
+        run_ids[:len(positions)] = self._run_ids[positions]
+        indices[:len(positions)] = self._indices[positions]
+        self._run_ids = run_ids
+        self._indices = indices
+        self._size = len(positions)
+        self.prune()
+
+    def prune(self):
+        """
+        Remove the runs which are no longer referenced by any point from the run table.
+        """
+        used = np.zeros(len(self._run_table) + 1, dtype=bool)
+        # run id -1 wraps around to the trailing entry
+        used[self.run_ids] = True
+        if used[:-1].all():
+            return
+        kept = np.flatnonzero(used[:-1])
+        mapping = np.full(len(self._run_table) + 1, self.NO_RUN, dtype=np.int32)
+        mapping[kept] = np.arange(len(kept))
+        self._run_ids[:self._size] = mapping[self.run_ids]
+        self._run_table = [self._run_table[i] for i in kept]
+        self._run_lookup = {id(run): i for i, run in enumerate(self._run_table)}
+
+    def extend(self, parents, indices, keep=None):
+        """
+        Append references for a batch of points.
+
+        Parameters
+        ----------
+        parents: object or list(object)
+            A single parent for the whole batch or one parent per point.
+        indices: array_like
+            The index within the parent of each point in the batch.
+        keep: array_like(int) or None, optional. Default=None.
+            Positions within the batch for which the reference is stored. All
+            positions are stored if None.
+        """
+        n = len(indices)
+        if n == 0:
+            return
+        indices = np.asarray(indices)
+        start = self._reserve(n, indices.dtype)
+        rows = np.arange(n) if keep is None else np.asarray(keep, dtype=np.intp)
+        if any(isinstance(parents, o) for o in (list, tuple, np.ndarray)):
+            ids = np.fromiter((self._lookup_run(parents[row]) for row in rows), dtype=np.int32, count=len(rows))
+        else:
+            ids = self._lookup_run(parents)
+        self._run_ids[start + rows] = ids
+        self._indices[start + rows] = indices[rows]
+
+    @staticmethod
+    def _as_scalar(value):
+        return value.item() if isinstance(value, np.generic) else value
+
+    def _lookup_run(self, run):
+        if run is None:
+            return self.NO_RUN
+        key = id(run)
+        if key not in self._run_lookup:
+            self._run_lookup[key] = len(self._run_table)
+            self._run_table.append(run)
+        return self._run_lookup[key]
+
+    def _reserve(self, n, dtype):
+        start = self._size
+        required = start + n
+        capacity = len(self._run_ids)
+        dtype = self._promote_index_dtype(self._indices.dtype, dtype)
+        if required > capacity or dtype != self._indices.dtype:
+            while capacity < required:
+                capacity *= 2
+            run_ids = np.full(capacity, self.NO_RUN, dtype=np.int32)
+            indices = np.zeros(capacity, dtype=dtype)
+            run_ids[:start] = self._run_ids[:start]
+            indices[:start] = self._indices[:start]
+            self._run_ids = run_ids
+            self._indices = indices
+        self._size = required
+        return start
+
+    @staticmethod
+    def _promote_index_dtype(current, new):
+        if current.kind in 'iu' and new.kind in 'biu':
+            return current
+        if current.kind in 'iuf' and new.kind in 'biuf':
+            return np.dtype(np.float64)
+        return np.dtype(object)
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def simplify_polygon(points, tolerance):
+    """
+    Reduce the vertices of a closed polygon with the Douglas-Peucker algorithm.
+
+    The extreme points in x and y are always kept, so the bounding box of the simplified
+    polygon matches that of the original.
+
+    Parameters
+    ----------
+    points: numpy.array (ndim=2)
+        An (n, 2) array of the x, y coordinates of the polygon vertices, in order and without
+        repeating the first vertex.
+    tolerance: float
+        The maximum distance of a discarded vertex from the simplified polygon.
+
+    Returns
+    -------
+    positions: numpy.array(int)
+        The positions of the kept vertices, in order.
+    """
+    n = len(points)
+    if n < 4:
+        return np.arange(n)
+
+    anchors = np.unique(np.concatenate([points.argmin(axis=0), points.argmax(axis=0)]))
+    keep = np.zeros(n, dtype=bool)
+    keep[anchors] = True
+    # simplify the chain between each pair of consecutive anchors, wrapping around the polygon
+    for start, end in zip(anchors, np.roll(anchors, -1)):
+        chain = np.arange(start, end + n + 1 if end <= start else end + 1) % n
+        keep[chain[_douglas_peucker(points[chain], tolerance)]] = True
+    return np.flatnonzero(keep)
+
+
+def _douglas_peucker(points, tolerance):
+    # positions of the kept points of an open chain, the end points are always kept
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        segment = points[j] - points[i]
+        relative = points[i + 1:j] - points[i]
+        length = np.hypot(*segment)
+        if length == 0.:
+            distance = np.hypot(relative[:, 0], relative[:, 1])
+        else:
+            distance = np.abs(segment[0] * relative[:, 1] - segment[1] * relative[:, 0]) / length
+        k = np.argmax(distance)
+        if distance[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.extend([(i, k), (k, j)])
+    return np.flatnonzero(keep)
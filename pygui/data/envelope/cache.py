@@ -0,0 +1,164 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from data._entries import entry_name, file_entries, is_cacheable, remove_outdated, staged_entry
+
+
+class EnvelopeCache(object):
+    """
+    An on-disk cache of the hull vertices of individual files.
+
+    Each entry stores the x, y data and row index of the envelope vertices of one file for
+    one pair of x, y names. Entries are keyed by the file's path, the keyword arguments it was
+    read with and its modification time and size, so an entry is no longer used once its file
+    changes.
+
+    Parameters
+    ----------
+    directory: str
+        The directory in which the cache entries are stored. Created if it does not exist.
+    max_size: int or None, optional. Default=None.
+        The maximum total size of the cache entries in bytes. When exceeded, the least
+        recently used entries are removed. The size is unbounded if None.
+    """
+
+    EXTENSION = '.npz'
+
+    def __init__(self, directory, max_size=None):
+        self.directory = directory
+        self.max_size = max_size
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def size(self):
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        for path in self._entries():
+            self._remove(path)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is within its maximum size.
+        """
+        if self.max_size is None:
+            return
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def get(self, filepath, xname, yname, **kwargs):
+        """
+        Get the cached envelope vertices of a file.
+
+        Parameters
+        ----------
+        filepath: str
+            The file which was enveloped.
+        xname: str
+            The name of the x data column.
+        yname: str
+            The name of the y data column.
+        **kwargs
+            The keyword arguments the file is read with.
+
+        Returns
+        -------
+        vertices: tuple(numpy.array, numpy.array, numpy.array) or None
+            The x, y data and row index of the envelope vertices, or None if the file is
+            not in the cache or has changed since it was cached.
+        """
+        path = self._entry_path(filepath, xname, yname, kwargs)
+        if path is None:
+            return None
+        try:
+            with np.load(path) as data:
+                vertices = data['x'], data['y'], data['indices']
+        except (OSError, KeyError, ValueError):
+            return None
+        # mark the entry as recently used
+        os.utime(path)
+        return vertices
+
+    def invalidate(self, filepath):
+        """
+        Remove all entries of a file from the cache.
+
+        Parameters
+        ----------
+        filepath: str
+            The file whose entries are removed.
+        """
+        for path in file_entries(self.directory, filepath):
+            self._remove(path)
+
+    def put(self, filepath, xname, yname, x, y, indices, **kwargs):
+        """
+        Store the envelope vertices of a file, replacing any outdated entry.
+
+        Parameters
+        ----------
+        filepath: str
+            The file which was enveloped.
+        xname: str
+            The name of the x data column.
+        yname: str
+            The name of the y data column.
+        x: array_like
+            The x data of the envelope vertices.
+        y: array_like
+            The y data of the envelope vertices.
+        indices: array_like
+            The row index of the envelope vertices within the file.
+        **kwargs
+            The keyword arguments the file was read with.
+
+        Returns
+        -------
+        cached: bool
+            False if the vertices cannot be cached, i.e. their row index is not numeric, boolean or datetime,
+            or the keyword arguments cannot be serialized.
+        """
+        indices = np.asarray(indices)
+        path = self._entry_path(filepath, xname, yname, kwargs)
+        if path is None or not is_cacheable(indices.dtype):
+            return False
+        remove_outdated(path, self._remove)
+        with staged_entry(path, self._remove) as tmp:
+            np.savez(tmp, x=np.asarray(x), y=np.asarray(y), indices=indices)
+        self.evict()
+        return True
+
+    def _entries(self):
+        return glob.glob(os.path.join(self.directory, '*-*-*' + self.EXTENSION))
+
+    def _entry_path(self, filepath, xname, yname, kwargs):
+        try:
+            key = json.dumps([str(xname), str(yname), kwargs], sort_keys=True)
+        except TypeError:
+            return None
+        return os.path.join(self.directory, entry_name(filepath, key) + self.EXTENSION)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,34 +1,532 @@
 import os
 
 import multiprocessing as mp
+import numpy as np
+import threading
 
-from . import Envelope
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from pandas import read_csv
+
+from . import Envelope, GridEnvelope
+from ._filter import hull_candidates
+from data import RunHandle
+
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
 
-# TODO: IMPLEMENT ABILITY TO HANDLE DIFFERENT XNAME/YNAME PER FILEPATH
-# TODO: IMPLEMENT ABILITY TO KEEP ALL POINTS WITH MULTIPROCESSING
-# TODO: IMPLEMENT MPI INTERFACE
 # TODO: IMPLEMENT ABILITY TO PASS ARGS AND KWARGS INTO MPI INTERFACE
 
 
+def shared_point_arrays(buffer, nrows):
+    """
+    Map the x data, y data and row index arrays of a shared memory block.
+
+    Parameters
+    ----------
+    buffer: memoryview
+        The buffer of the shared memory block.
+    nrows: int
+        The number of rows held in the block.
+
+    Returns
+    -------
+    x: numpy.array(float)
+    y: numpy.array(float)
+    indices: numpy.array(int)
+    """
+    x = np.ndarray((nrows,), dtype=np.float64, buffer=buffer, offset=0)
+    y = np.ndarray((nrows,), dtype=np.float64, buffer=buffer, offset=8 * nrows)
+    indices = np.ndarray((nrows,), dtype=np.int64, buffer=buffer, offset=16 * nrows)
+    return x, y, indices
+
+
 class MultiProcessEnvelopeGenerator(object):
+    """
+    Compute envelopes over many files using a persistent pool of worker processes.
+
+    The pool is created on first use and reused by every subsequent envelope request
+    until the generator is closed. The generator can be used as a context manager to
+    close the pool automatically.
+
+    Parameters
+    ----------
+    ncpus: int or None, optional. Default=None.
+        The number of worker processes. Defaults to the number of CPUs.
+    cache: EnvelopeCache or None, optional. Default=None.
+        A cache of per-file envelope vertices. Files found in the cache are not re-read.
+    """
 
-    def __init__(self, ncpus=None):
+    def __init__(self, ncpus=None, cache=None):
         self.ncpus = ncpus if ncpus is not None else mp.cpu_count()
+        self.cache = cache
+
+        self._pool = None
+        self._jobs = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def pool(self):
+        # the pool may be requested from both the caller's thread and the background job thread
+        with self._lock:
+            if self._pool is None:
+                self._pool = mp.Pool(processes=self.ncpus)
+            return self._pool
+
+    def close(self):
+        """
+        Wait for all submitted envelopes to finish and shut down the worker processes.
+        """
+        if self._jobs is not None:
+            self._jobs.shutdown(wait=True)
+            self._jobs = None
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def compute_envelope(self, xname, yname, filepaths, progress=None, keep_all=False):
+        """
+        Compute the envelope of all the given files.
+
+        Parameters
+        ----------
+        xname: str
+            The name of the x data column.
+        yname: str
+            The name of the y data column.
+        filepaths: list(str)
+            The CSV files to be enveloped.
+        progress: callable or None, optional. Default=None.
+            Called as progress(completed, total) each time a file has been processed.
+        keep_all: bool, optional. Default=False.
+            Keep all points of the files in the envelope rather than only its vertices.
+
+        Returns
+        -------
+        envelope: Envelope
+        """
+        envelopes = self.compute_envelopes([(xname, yname)], filepaths, progress=progress, keep_all=keep_all)
+        return envelopes[(xname, yname)]
+
+    def compute_envelopes(self, names, filepaths, progress=None, keep_all=False):
+        """
+        Compute the envelopes of several pairs of x, y data over all the given files.
+
+        Each file is only read once, for all of the pairs.
+
+        Parameters
+        ----------
+        names: list(tuple(str, str))
+            The (xname, yname) pairs to be enveloped.
+        filepaths: list(str)
+            The CSV files to be enveloped.
+        progress: callable or None, optional. Default=None.
+            Called as progress(completed, total) each time a file has been processed.
+        keep_all: bool, optional. Default=False.
+            Keep all points of the files in the envelopes rather than only their vertices.
+
+        Returns
+        -------
+        envelopes: dict{tuple(str, str): Envelope}
+            The envelope of each (xname, yname) pair.
+        """
+        names = list(dict.fromkeys(tuple(pair) for pair in names))
+        if not filepaths:
+            raise ValueError("No files were given to envelope.")
+        if keep_all:
+            return self._compute_all_points(names, filepaths, progress)
+
+        pool = self.pool
+        inputs = [(names, filepath, self.cache) for filepath in filepaths]
+        data = []
+        for result in pool.imap_unordered(self._get_envelopes_data, inputs):
+            data.append(result)
+            if progress is not None:
+                progress(len(data), len(inputs))
+
+        # tree reduction, each round merges pairs of envelopes in parallel
+        while len(data) > 1:
+            pairs = [(data[i], data[i + 1]) for i in range(0, len(data) - 1, 2)]
+            merged = pool.starmap(self.merge_envelopes_data, pairs)
+            if len(data) % 2:
+                merged.append(data[-1])
+            data = merged
+
+        return {(xname, yname): Envelope.from_points(xname, yname, *data[0][(xname, yname)])
+                for xname, yname in names}
+
+    def compute_grid_envelope(self, xname, yname, filepaths, xlim, ylim, shape=GridEnvelope.DEFAULT_SHAPE,
+                              progress=None):
+        """
+        Compute the occupancy grid envelope of all the given files.
+
+        Each file is rasterized by a worker and the grids are merged with a bitwise OR of their
+        occupancy in a tree reduction. The first point seen in each cell is taken in file order.
+
+        Parameters
+        ----------
+        xname: str
+            The name of the x data column.
+        yname: str
+            The name of the y data column.
+        filepaths: list(str)
+            The CSV files to be enveloped.
+        xlim: tuple(float, float)
+            The lower and upper limit of the x data covered by the grid.
+        ylim: tuple(float, float)
+            The lower and upper limit of the y data covered by the grid.
+        shape: tuple(int, int), optional. Default=(512, 512).
+            The number of cells of the grid in x and y.
+        progress: callable or None, optional. Default=None.
+            Called as progress(completed, total) each time a file has been processed.
+
+        Returns
+        -------
+        envelope: GridEnvelope
+        """
+        if not filepaths:
+            raise ValueError("No files were given to envelope.")
+        pool = self.pool
+        inputs = [(xname, yname, filepath, xlim, ylim, shape) for filepath in filepaths]
+        envelopes = []
+        for env in pool.imap(self._get_grid_envelope, inputs):
+            envelopes.append(env)
+            if progress is not None:
+                progress(len(envelopes), len(inputs))
+
+        while len(envelopes) > 1:
+            pairs = [(envelopes[i], envelopes[i + 1]) for i in range(0, len(envelopes) - 1, 2)]
+            merged = pool.starmap(self.merge_grid_envelopes, pairs)
+            if len(envelopes) % 2:
+                merged.append(envelopes[-1])
+            envelopes = merged
+        return envelopes[0]
+
+    def submit(self, xname, yname, filepaths, progress=None, keep_all=False):
+        """
+        Compute an envelope in the background.
+
+        Submitted envelopes are computed one after another, each using the whole pool.
+
+        Parameters
+        ----------
+        xname: str
+            The name of the x data column.
+        yname: str
+            The name of the y data column.
+        filepaths: list(str)
+            The CSV files to be enveloped.
+        progress: callable or None, optional. Default=None.
+            Called as progress(completed, total) each time a file has been processed. Note
+            that the callback is called from a background thread.
+        keep_all: bool, optional. Default=False.
+            Keep all points of the files in the envelope rather than only its vertices.
+
+        Returns
+        -------
+        future: concurrent.futures.Future
+            A future whose result is the Envelope.
+        """
+        if self._jobs is None:
+            self._jobs = ThreadPoolExecutor(max_workers=1)
+        return self._jobs.submit(self.compute_envelope, xname, yname, filepaths, progress=progress,
+                                 keep_all=keep_all)
+
+    @staticmethod
+    def share_points(names, filepath):
+        """
+        Read the x, y data of a file into shared memory, one block per (xname, yname) pair.
+
+        Each block holds the x data, y data and row index of every row of the file, see
+        shared_point_arrays. The caller takes ownership of the blocks and must unlink them.
+
+        Parameters
+        ----------
+        names: list(tuple(str, str))
+            The (xname, yname) pairs to be read.
+        filepath: str
+            The CSV file to be read.
+
+        Returns
+        -------
+        filepath: str
+            The file which was read.
+        blocks: dict{tuple(str, str): tuple(str, int)}
+            The name of the shared memory block and the number of rows for each pair.
+        """
+        columns = list(dict.fromkeys(name for pair in names for name in pair))
+        frame = read_csv(filepath, usecols=columns)
+        nrows = len(frame)
+        blocks = {}
+        try:
+            for xname, yname in names:
+                shm = shared_memory.SharedMemory(create=True, size=max(1, 3 * 8 * nrows))
+                # ownership passes to the parent process, which unlinks the block once it has been read
+                resource_tracker.unregister(shm._name, 'shared_memory')
+                blocks[(xname, yname)] = (shm.name, nrows)
+                try:
+                    x, y, indices = shared_point_arrays(shm.buf, nrows)
+                    x[:] = frame[xname].to_numpy(dtype=float)
+                    y[:] = frame[yname].to_numpy(dtype=float)
+                    indices[:] = np.asarray(frame.index)
+                    del x, y, indices
+                finally:
+                    shm.close()
+        except BaseException:
+            # the parent never learns of the blocks of a failed file
+            MultiProcessEnvelopeGenerator._unlink_blocks(blocks)
+            raise
+        return filepath, blocks
+
+    @classmethod
+    def _share_points(cls, args):
+        return cls.share_points(*args)
+
+    def _compute_all_points(self, names, filepaths, progress=None):
+        envelopes = {}
+        inputs = [(names, filepath) for filepath in filepaths]
+        results = self.pool.imap_unordered(self._share_points, inputs)
+        try:
+            for completed, (filepath, blocks) in enumerate(results):
+                try:
+                    self._add_shared_points(envelopes, RunHandle(filepath), blocks)
+                finally:
+                    self._unlink_blocks(blocks)
+                if progress is not None:
+                    progress(completed + 1, len(inputs))
+        except BaseException:
+            # the files still being read have shared their blocks, which only this process can unlink
+            self._drain_shared_points(results)
+            raise
+        return envelopes
+
+    @staticmethod
+    def _add_shared_points(envelopes, handle, blocks):
+        for (xname, yname), (block, nrows) in blocks.items():
+            if nrows == 0:
+                continue
+            shm = shared_memory.SharedMemory(name=block)
+            try:
+                x, y, indices = shared_point_arrays(shm.buf, nrows)
+                if (xname, yname) in envelopes:
+                    envelopes[(xname, yname)].add_points(x, y, handle, indices)
+                else:
+                    envelopes[(xname, yname)] = Envelope.from_points(xname, yname, x, y, handle, indices,
+                                                                     keep_all=True)
+                del x, y, indices
+            finally:
+                shm.close()
+
+    @classmethod
+    def _drain_shared_points(cls, results):
+        while True:
+            try:
+                _, blocks = next(results)
+            except StopIteration:
+                return
+            except Exception:
+                continue
+            cls._unlink_blocks(blocks)
+
+    @staticmethod
+    def _unlink_blocks(blocks):
+        for block, _ in blocks.values():
+            try:
+                shm = shared_memory.SharedMemory(name=block)
+            except FileNotFoundError:
+                continue
+            shm.close()
+            shm.unlink()
+
+    @staticmethod
+    def get_envelope_data(xname, yname, filepath, cache=None):
+        return MultiProcessEnvelopeGenerator.get_envelopes_data([(xname, yname)], filepath, cache)[(xname, yname)]
+
+    @staticmethod
+    def get_envelopes_data(names, filepath, cache=None):
+        # return a handle to the file rather than the run itself to avoid pickling the run data
+        handle = RunHandle(filepath)
+        data = {}
+
+        missing = []
+        for xname, yname in names:
+            vertices = None if cache is None else cache.get(filepath, xname, yname)
+            if vertices is None:
+                missing.append((xname, yname))
+            else:
+                x, y, indices = vertices
+                data[(xname, yname)] = (x, y, [handle] * len(x), indices.tolist())
+
+        if missing:
+            # read every column needed by any of the pairs at once
+            columns = list(dict.fromkeys(name for pair in missing for name in pair))
+            frame = read_csv(filepath, usecols=columns)
+            for xname, yname in missing:
+                points = np.column_stack([frame[xname].to_numpy(dtype=float), frame[yname].to_numpy(dtype=float)])
+                vertices = hull_candidates(points)
+                x, y, indices = points[vertices, 0], points[vertices, 1], np.asarray(frame.index)[vertices]
+                if cache is not None:
+                    cache.put(filepath, xname, yname, x, y, indices)
+                data[(xname, yname)] = (x, y, [handle] * len(x), indices.tolist())
+        return data
+
+    @classmethod
+    def _get_envelopes_data(cls, args):
+        return cls.get_envelopes_data(*args)
+
+    @staticmethod
+    def get_grid_envelope(xname, yname, filepath, xlim, ylim, shape=GridEnvelope.DEFAULT_SHAPE):
+        frame = read_csv(filepath, usecols=[xname, yname])
+        return GridEnvelope.from_points(xname, yname, frame[xname], frame[yname], RunHandle(filepath), frame.index,
+                                        xlim, ylim, shape=shape)
+
+    @classmethod
+    def _get_grid_envelope(cls, args):
+        return cls.get_grid_envelope(*args)
+
+    @staticmethod
+    def merge_grid_envelopes(env1, env2):
+        env1.absorb_envelopes(env2)
+        return env1
+
+    @staticmethod
+    def merge_envelope_data(data1, data2):
+        x = np.concatenate([data1[0], data2[0]])
+        y = np.concatenate([data1[1], data2[1]])
+        parents = list(data1[2]) + list(data2[2])
+        indices = list(data1[3]) + list(data2[3])
+        candidates = hull_candidates(np.column_stack([x, y]))
+        return (x[candidates],
+                y[candidates],
+                [parents[i] for i in candidates],
+                [indices[i] for i in candidates])
+
+    @classmethod
+    def merge_envelopes_data(cls, data1, data2):
+        return {key: cls.merge_envelope_data(data1[key], data2[key]) for key in data1}
+
+
+class MPIEnvelopeGenerator(object):
+    """
+    Compute envelopes over many files distributed across the ranks of an MPI communicator.
+
+    The file paths are scattered from the root rank, each rank envelopes its own files and
+    the results are merged back to the root with a binary tree reduction. Every rank of the
+    communicator must call compute_envelope, e.g. from a script launched with
+
+        mpirun -n 4 python script.py
+
+    Parameters
+    ----------
+    comm: mpi4py.MPI.Comm or None, optional. Default=None.
+        The communicator to use. Defaults to MPI.COMM_WORLD.
+    root: int, optional. Default=0.
+        The rank which distributes the file paths and receives the envelope.
+    cache: EnvelopeCache or None, optional. Default=None.
+        A cache of per-file envelope vertices. Files found in the cache are not re-read.
+
+    Notes
+    -----
+    .. [1] Requires mpi4py.
+    .. [2] The file paths must be accessible from the rank they are sent to.
+    """
+
+    def __init__(self, comm=None, root=0, cache=None):
+        if MPI is None:
+            raise ImportError("mpi4py is required for the MPIEnvelopeGenerator.")
+        self.comm = comm if comm is not None else MPI.COMM_WORLD
+        self.root = root
+        self.cache = cache
+
+    @property
+    def rank(self):
+        return self.comm.Get_rank()
+
+    @property
+    def size(self):
+        return self.comm.Get_size()
+
+    def compute_envelope(self, xname, yname, filepaths=None):
+        """
+        Compute the envelope of all the given files.
+
+        Parameters
+        ----------
+        xname: str
+            The name of the x data column.
+        yname: str
+            The name of the y data column.
+        filepaths: list(str) or None, optional. Default=None.
+            The CSV files to be enveloped. Only used on the root rank.
+
+        Returns
+        -------
+        envelope: Envelope or None
+            The envelope on the root rank, None on all other ranks.
+        """
+        envelopes = self.compute_envelopes([(xname, yname)], filepaths)
+        return None if envelopes is None else envelopes[(xname, yname)]
+
+    def compute_envelopes(self, names, filepaths=None):
+        """
+        Compute the envelopes of several pairs of x, y data over all the given files.
+
+        Each file is only read once, for all of the pairs.
+
+        Parameters
+        ----------
+        names: list(tuple(str, str))
+            The (xname, yname) pairs to be enveloped. Must be the same on every rank.
+        filepaths: list(str) or None, optional. Default=None.
+            The CSV files to be enveloped. Only used on the root rank.
+
+        Returns
+        -------
+        envelopes: dict{tuple(str, str): Envelope} or None
+            The envelope of each (xname, yname) pair on the root rank, None on all other ranks.
+        """
+        names = list(dict.fromkeys(tuple(pair) for pair in names))
+        chunks = None
+        if self.rank == self.root:
+            chunks = [filepaths[i::self.size] for i in range(self.size)]
+        local = self.comm.scatter(chunks, root=self.root)
+
+        data = None
+        for filepath in local:
+            data = self._merge(data, MultiProcessEnvelopeGenerator.get_envelopes_data(names, filepath, self.cache))
+        data = self._reduce(data)
 
-    def compute_envelope(self, xname, yname, filepaths):
-        pool = mp.Pool(processes=self.ncpus)
-        env0 = Envelope.from_file(xname, yname, filepaths[0])
-        inputs = [(xname, yname, filepath) for filepath in filepaths[1:]]
-        data = pool.starmap(self.get_envelope_data, inputs)
-        for x, y, parents, indices in data:
-            env0.add_points(x, y, parents, indices)
-        return env0
+        if self.rank != self.root:
+            return None
+        if data is None:
+            raise ValueError("No files were given to envelope.")
+        return {(xname, yname): Envelope.from_points(xname, yname, *data[(xname, yname)]) for xname, yname in names}
 
     @staticmethod
-    def get_envelope_data(xname, yname, filepath):
-        env = Envelope.from_file(xname, yname, filepath)
-        return (env.envelope_x(closed=False),
-                env.envelope_y(closed=False),
-                env.envelope_runs(closed=False),
-                env.envelope_indices(closed=False))
+    def _merge(data1, data2):
+        if data1 is None or data2 is None:
+            return data2 if data1 is None else data1
+        return MultiProcessEnvelopeGenerator.merge_envelopes_data(data1, data2)
 
+    def _reduce(self, data):
+        # binomial tree reduction to the root, ranks are numbered relative to the root
+        relative = (self.rank - self.root) % self.size
+        step = 1
+        while step < self.size:
+            if relative % (2 * step) == step:
+                self.comm.send(data, dest=(relative - step + self.root) % self.size)
+                return None
+            partner = relative + step
+            if relative % (2 * step) == 0 and partner < self.size:
+                data = self._merge(data, self.comm.recv(source=(partner + self.root) % self.size))
+            step *= 2
+        return data
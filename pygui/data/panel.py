@@ -0,0 +1,208 @@
+import numpy as np
+
+from pandas import Categorical, DataFrame, Index, MultiIndex, Series
+from pandas.api.types import is_numeric_dtype
+
+
+class RunPanel(object):
+    """
+    The columns of many Runs stacked end to end for vectorized statistics across the Runs.
+
+    The values of the Runs are held in a single (rows, columns) float array along with the offset
+    of each Run's rows, so statistics over all of the Runs or per Run are computed by numpy over
+    the whole array rather than Run by Run.
+
+    Parameters
+    ----------
+    runs: list(Run)
+        The Runs to be stacked.
+    columns: str or list(str) or None, optional. Default=None.
+        The columns to be stacked. Defaults to the numeric or boolean columns which all of the Runs have in common.
+
+    Raises
+    ------
+    ValueError
+        If a column which is given is not numeric or boolean in one of the Runs.
+
+    Notes
+    -----
+    .. [1] The values are copied into the stacked array once. The frame view does not copy them again.
+    .. [2] Missing values are skipped by the statistics, as by pandas.
+    """
+
+    def __init__(self, runs, columns=None):
+        runs = list(runs)
+        if columns is None:
+            shared = [] if not runs else [c for c in runs[0].columns if all(c in run.columns for run in runs[1:])]
+            columns = [c for c in shared if all(is_numeric_dtype(run[c]) for run in runs)]
+        else:
+            columns = [columns] if isinstance(columns, str) else list(columns)
+            for run in runs:
+                for column in columns:
+                    if column in run.columns and not is_numeric_dtype(run[column]):
+                        raise ValueError("Cannot stack the non-numeric column %s of Run %s." % (column, run.name))
+
+        self.names = tuple(run.name for run in runs)
+        self.columns = Index(columns)
+
+        lengths = np.array([len(run) for run in runs], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        # column major, so that each column is contiguous for the reductions
+        self.values = np.empty((self.offsets[-1], len(columns)), order='F')
+        indices = []
+        for run, start, stop in zip(runs, self.offsets[:-1], self.offsets[1:]):
+            for j, column in enumerate(columns):
+                self.values[start:stop, j] = run[column]
+            indices.append(np.asarray(run.index))
+        self._row_index = np.concatenate(indices) if indices else np.empty(0)
+
+        self._frame = None
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def frame(self):
+        """
+        The stacked values as a DataFrame indexed by (run, row).
+        """
+        if self._frame is None:
+            runs = Categorical.from_codes(self._run_codes(), categories=Index(self.names, dtype=object))
+            index = MultiIndex.from_arrays([runs, self._row_index], names=['run', 'row'])
+            self._frame = DataFrame(self.values, index=index, columns=self.columns, copy=False)
+        return self._frame
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def argmax(self, per_run=False):
+        """
+        Locate the maximum of each column.
+
+        Parameters
+        ----------
+        per_run: bool, optional. Default=False.
+            Locate the maximum within each Run rather than over all of the Runs.
+
+        Returns
+        -------
+        location: pandas.DataFrame
+            The 'run' name and row 'index' of the maximum and its 'value', for each column. If per_run,
+            the row 'index' of the maximum for each Run and column, indexed by run name.
+        """
+        return self._locate(True, per_run)
+
+    def argmin(self, per_run=False):
+        """
+        Locate the minimum of each column. See argmax.
+        """
+        return self._locate(False, per_run)
+
+    def max(self, per_run=False):
+        """
+        Get the maximum of each column.
+
+        Parameters
+        ----------
+        per_run: bool, optional. Default=False.
+            Get the maximum within each Run rather than over all of the Runs.
+
+        Returns
+        -------
+        max: pandas.Series or pandas.DataFrame
+            The maximum of each column, or of each Run and column indexed by run name if per_run.
+        """
+        return self._reduce(np.fmax, per_run)
+
+    def min(self, per_run=False):
+        """
+        Get the minimum of each column. See max.
+        """
+        return self._reduce(np.fmin, per_run)
+
+    def quantile(self, q=0.5, per_run=False):
+        """
+        Get a quantile of each column, linearly interpolated per pandas.DataFrame.quantile.
+
+        Parameters
+        ----------
+        q: float, optional. Default=0.5.
+            The quantile, between 0 and 1.
+        per_run: bool, optional. Default=False.
+            Get the quantile within each Run rather than over all of the Runs.
+
+        Returns
+        -------
+        quantile: pandas.Series or pandas.DataFrame
+            The quantile of each column, or of each Run and column indexed by run name if per_run.
+        """
+        if not per_run:
+            with np.errstate(invalid='ignore'):
+                values = np.nanquantile(self.values, q, axis=0) if len(self) else np.full(len(self.columns), np.nan)
+            return Series(values, index=self.columns, name=q)
+
+        # sort each run's values, with the missing values last, and interpolate between the sorted values
+        ordered = self.values.copy(order='F')
+        for start, stop in zip(self.offsets[:-1], self.offsets[1:]):
+            ordered[start:stop].sort(axis=0)
+        counts = np.zeros((len(self.names), len(self.columns)), dtype=np.int64)
+        nonempty = self.lengths > 0
+        if np.any(nonempty):
+            counts[nonempty] = np.add.reduceat(~np.isnan(self.values), self.offsets[:-1][nonempty], axis=0)
+        result = np.full((len(self.names), len(self.columns)), np.nan)
+        for j in range(len(self.columns)):
+            column = ordered[:, j]
+            valid = counts[:, j] > 0
+            position = self.offsets[:-1][valid] + q * (counts[valid, j] - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.ceil(position).astype(np.int64)
+            result[valid, j] = column[lower] + (column[upper] - column[lower]) * (position - lower)
+        return DataFrame(result, index=self._run_index(), columns=self.columns)
+
+    def _locate(self, maximum, per_run):
+        ufunc = np.fmax if maximum else np.fmin
+        extremes = self._reduce(ufunc, per_run).to_numpy()
+        # the first position of each extreme, -1 where a column or run has only missing values
+        if not per_run:
+            first = np.full(len(self.columns), -1)
+            for j, value in enumerate(extremes):
+                if not np.isnan(value):
+                    first[j] = np.argmax(self.values[:, j] == value)
+            runs = np.searchsorted(self.offsets, first, side='right') - 1
+            names = np.array(self.names + (None,), dtype=object)
+            return DataFrame({'run': names[np.where(first >= 0, runs, -1)], 'index': self._row_labels(first),
+                              'value': extremes}, index=self.columns)
+
+        first = np.full((len(self.names), len(self.columns)), -1)
+        for j in range(len(self.columns)):
+            positions = np.flatnonzero(self.values[:, j] == np.repeat(extremes[:, j], self.lengths))
+            runs = np.searchsorted(self.offsets, positions, side='right') - 1
+            # positions are in order, so the first position of each run follows a change of run
+            leading = np.concatenate([[True], runs[1:] != runs[:-1]])
+            first[runs[leading], j] = positions[leading]
+        return DataFrame(self._row_labels(first), index=self._run_index(), columns=self.columns)
+
+    def _reduce(self, ufunc, per_run):
+        if not per_run:
+            values = ufunc.reduce(self.values, axis=0) if len(self) else np.full(len(self.columns), np.nan)
+            return Series(values, index=self.columns)
+
+        result = np.full((len(self.names), len(self.columns)), np.nan)
+        nonempty = self.lengths > 0
+        if np.any(nonempty):
+            result[nonempty] = ufunc.reduceat(self.values, self.offsets[:-1][nonempty], axis=0)
+        return DataFrame(result, index=self._run_index(), columns=self.columns)
+
+    def _row_labels(self, positions):
+        # the row index labels at the positions, None at -1
+        labels = np.full(positions.shape, None, dtype=object)
+        found = positions >= 0
+        labels[found] = self._row_index[positions[found]].astype(object)
+        return labels
+
+    def _run_codes(self):
+        return np.repeat(np.arange(len(self.names)), self.lengths)
+
+    def _run_index(self):
+        return Index(self.names, dtype=object, name='run')
@@ -1,8 +1,19 @@
+import copy
+import glob
+import os
 import warnings
 
-from pandas import DataFrame, read_csv
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pandas import DataFrame, Index, Series, read_csv
+from pandas.api.types import is_list_like
 from uuid import uuid4
 
+from .cache import RunCache
+from .panel import RunPanel
+from .summary import RunSummary
+
 
 class Run(DataFrame):
     """
@@ -14,6 +25,10 @@ class Run(DataFrame):
         Identifying name for the Run. See Note 1.
     description: str, optional. Default="".
         Additional details about the Run to be used in reports, etc.
+    filepath: str or None, optional. Default=None.
+        The file the Run data was read from, if any. Used to refer to the Run without its data.
+    read_kwargs: dict or None, optional. Default=None.
+        The keyword arguments the file was read with, so that it can be read again the same way.
     *args
         Variable length argument list to be passed to the super class constructor.
     **kwargs
@@ -28,18 +43,28 @@ class Run(DataFrame):
     --------
     .. [1] pandas.DataFrame
     """
-    def __init__(self, *args, name=None, description="", **kwargs):
+    DEFAULT_CACHE = None
+    """
+    The RunCache used by read_csv when no cache is given. CSVs are not cached if None.
+    """
+
+    # set as attributes rather than columns, a dict would otherwise be taken for column data
+    _metadata = ['read_kwargs']
+
+    def __init__(self, *args, name=None, description="", filepath=None, read_kwargs=None, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.name = name if name is not None else uuid4()
         self.description = description
+        self.filepath = filepath
+        self.read_kwargs = read_kwargs if read_kwargs is not None else {}
 
     @property
     def _constructor(self):
         return Run
 
     @classmethod
-    def read_csv(cls, filepath, name=None, description="", **kwargs):
+    def read_csv(cls, filepath, name=None, description="", cache=None, **kwargs):
         """
         Create a Run object by reading in a CSV per the pandas read_csv function.
 
@@ -51,6 +76,9 @@ class Run(DataFrame):
             Identifying name for the Run.
         description: str, optional. Default="".
             Additional details about the Run to be used in reports, etc.
+        cache: RunCache or None, optional. Default=None.
+            A columnar cache of the CSV data. If the CSV is unchanged since it was cached, its data is
+            memory mapped from the cache rather than parsed. Defaults to DEFAULT_CACHE.
         **kwargs
             Arbitrary keyword arguments to be passed into the read_csv function.
 
@@ -60,17 +88,314 @@ class Run(DataFrame):
             The Run containing the data from the CSV.
         """
         name = filepath if name is None else name
-        return Run(read_csv(filepath, **kwargs), name=name, description=description)
+        cache = cls.DEFAULT_CACHE if cache is None else cache
+        frame = None if cache is None else cache.get(filepath, **kwargs)
+        if frame is None:
+            frame = read_csv(filepath, **kwargs)
+            if cache is not None:
+                cache.put(filepath, frame, **kwargs)
+        return Run(frame, name=name, description=description, filepath=filepath, read_kwargs=kwargs)
+
+
+class RunHandle(object):
+    """
+    A lightweight reference to a Run stored in a CSV file.
+
+    The Run is not read in from the file until its data is first accessed, at which point
+    it is kept for subsequent access. Column access is forwarded to the loaded Run, so a
+    RunHandle can be used in place of a Run as the parent of envelope and plot data.
+
+    Parameters
+    ----------
+    filepath: str
+        The filepath of the CSV containing the Run data.
+    name: str or None, optional. Default=None.
+        Identifying name for the Run. Defaults to the filepath.
+    description: str, optional. Default="".
+        Additional details about the Run to be used in reports, etc.
+    cache: RunCache or None, optional. Default=None.
+        A columnar cache of the CSV data, see Run.read_csv.
+    **kwargs
+        Arbitrary keyword arguments to be passed into Run.read_csv when the Run is loaded.
+
+    Notes
+    -----
+    .. [1] The loaded Run is not pickled along with the handle.
+    """
+    def __init__(self, filepath, name=None, description="", cache=None, **kwargs):
+        self.filepath = filepath
+        self.name = filepath if name is None else name
+        self.description = description
+        self.cache = cache
+        self.read_kwargs = kwargs
+
+        self._run = None
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_run'] = None
+        return state
+
+    @property
+    def is_loaded(self):
+        return self._run is not None
+
+    def load(self):
+        """
+        Get the Run referenced by the handle, reading it in from file if necessary.
+
+        Returns
+        -------
+        run: Run
+        """
+        if self._run is None:
+            self._run = Run.read_csv(self.filepath, name=self.name, description=self.description, cache=self.cache,
+                                     **self.read_kwargs)
+        return self._run
+
+    def read_rows(self, labels, names=None):
+        """
+        Get a subset of rows of the Run without reading the whole Run into memory.
+
+        If the Run has already been loaded or is cached, the rows are taken from it instead of the file.
+
+        Parameters
+        ----------
+        labels: list
+            The index labels of the rows within the Run. These are the row positions unless an index
+            column is specified in the read keyword arguments.
+        names: list(str) or None, optional. Default=None.
+            The columns to read. All columns are read if None.
+
+        Returns
+        -------
+        run: Run
+            A Run containing only the requested rows, in file order and indexed by their labels.
+
+        Notes
+        -----
+        .. [1] The CSV is assumed to have a single header row.
+        .. [2] With an index column, the index column of the whole file is read to locate the rows.
+        """
+        run = self._run
+        if run is None:
+            cache = Run.DEFAULT_CACHE if self.cache is None else self.cache
+            run = None if cache is None else cache.get(self.filepath, **self.read_kwargs)
+        if run is not None:
+            run = run.iloc[self._locate_rows(run.index, labels)]
+            run = run if names is None else run[names]
+            return Run(run, name=self.name, description=self.description, filepath=self.filepath,
+                       read_kwargs=self.read_kwargs)
+
+        kwargs = dict(self.read_kwargs)
+        has_index = kwargs.get('index_col', None) is not None
+        if has_index:
+            positions = self._locate_rows(self._read_index(), labels).tolist()
+        else:
+            positions = sorted(set(int(p) for p in labels))
+        if names is not None and not has_index:
+            kwargs['usecols'] = names
+        # file row 0 is the header, data row i is file row i + 1
+        wanted = set(p + 1 for p in positions)
+        kwargs['skiprows'] = lambda row: row != 0 and row not in wanted
+        data = read_csv(self.filepath, **kwargs)
+        if not has_index:
+            data.index = positions
+        if names is not None:
+            data = data[names]
+        return Run(data, name=self.name, description=self.description)
+
+    def _read_index(self):
+        kwargs = dict(self.read_kwargs)
+        if isinstance(kwargs['index_col'], str):
+            kwargs['usecols'] = [kwargs['index_col']]
+        return read_csv(self.filepath, **kwargs).index
+
+    @staticmethod
+    def _locate_rows(index, labels):
+        # the positions of the rows with the given labels, in order
+        labels = list(labels)
+        positions = index.get_indexer_for(labels)
+        if np.any(positions < 0):
+            raise KeyError("Rows not found in the Run: %s" % [label for label in labels if label not in index])
+        return np.unique(positions)
+
+
+class LazyRun(RunHandle):
+    """
+    A Run stored in a CSV file whose columns are only loaded when they are first accessed.
+
+    The first time the Run's columns, index or length are needed, the CSV is stored in a RunCache.
+    From then on, run[column] memory maps the single column from the cache, so opening many runs
+    costs next to no memory and only the pages of the columns which are used are read from disk.
+    Selecting a list of columns returns a Run.
+
+    Parameters
+    ----------
+    filepath: str
+        The filepath of the CSV containing the Run data.
+    name: str or None, optional. Default=None.
+        Identifying name for the Run. Defaults to the filepath.
+    description: str, optional. Default="".
+        Additional details about the Run to be used in reports, etc.
+    cache: RunCache or None, optional. Default=None.
+        The cache the columns are loaded from. Defaults to Run.DEFAULT_CACHE, or a RunCache storing
+        the columns in a sidecar directory next to the CSV if that is None as well.
+    **kwargs
+        Arbitrary keyword arguments to be passed into Run.read_csv when the CSV is cached.
+
+    Notes
+    -----
+    .. [1] CSVs which cannot be cached, e.g. those with text columns, are read in whole instead.
+    .. [2] Loaded and assigned columns and any index which was set are not pickled along with the Run.
+    """
+    def __init__(self, filepath, name=None, description="", cache=None, **kwargs):
+        if cache is None:
+            cache = Run.DEFAULT_CACHE if Run.DEFAULT_CACHE is not None else RunCache()
+        super().__init__(filepath, name=name, description=description, cache=cache, **kwargs)
+
+        # the column names, index and loaded columns, read from the cache on first use
+        self._names = None
+        self._index = None
+        self._columns = {}
+
+    def __contains__(self, key):
+        return key in self._describe()
+
+    def __getitem__(self, key):
+        if is_list_like(key):
+            columns = {name: self._get_column(name) for name in key}
+            return self._constructor(columns, index=self.index, copy=False, name=self.name,
+                                     description=self.description, filepath=self.filepath)
+        return self._get_column(key)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.update(_names=None, _index=None, _columns={})
+        return state
+
+    def __iter__(self):
+        return iter(self._describe())
+
+    def __len__(self):
+        return len(self.index)
+
+    def __setitem__(self, key, value):
+        names = self._describe()
+        self._columns[key] = Series(value, index=self.index, name=key)
+        if key not in names:
+            names.append(key)
+
+    @property
+    def columns(self):
+        return Index(self._describe())
+
+    @property
+    def index(self):
+        self._describe()
+        return self._index
+
+    @property
+    def loaded_columns(self):
+        return tuple(self._columns)
+
+    @property
+    def _constructor(self):
+        return Run
+
+    def load(self):
+        """
+        Get all of the columns of the Run.
+
+        Returns
+        -------
+        run: Run
+            The Run, whose columns are memory mapped from the cache.
+        """
+        return self[list(self.columns)]
+
+    def read_rows(self, labels, names=None):
+        """
+        Get a subset of rows of the Run, loading only the requested columns.
+
+        Parameters
+        ----------
+        labels: list
+            The index labels of the rows within the Run.
+        names: list(str) or None, optional. Default=None.
+            The columns to read. All columns are read if None.
+
+        Returns
+        -------
+        run: Run
+            A Run containing only the requested rows, in order and indexed by their labels.
+        """
+        run = self[list(self.columns) if names is None else names]
+        return Run(run.iloc[self._locate_rows(self.index, labels)], name=self.name, description=self.description,
+                   filepath=self.filepath, read_kwargs=self.read_kwargs)
+
+    def set_index(self, keys, drop=False, inplace=False, append=False, verify_integrity=False):
+        """
+        Set the index of the Run from its columns, per the pandas DataFrame.set_index function.
+
+        Returns
+        -------
+        run: LazyRun or None
+            The Run with the new index, or None if inplace.
+        """
+        keys = list(keys) if is_list_like(keys) else [keys]
+        frame = DataFrame({key: self[key] for key in keys}, index=self.index, copy=False)
+        index = frame.set_index(keys, append=append).index
+        if verify_integrity and not index.is_unique:
+            raise ValueError("Index has duplicate keys: %s" % index[index.duplicated()].unique().tolist())
+
+        run = self if inplace else copy.copy(self)
+        run._index = index
+        run._names = [name for name in self._names if not (drop and name in keys)]
+        run._columns = {name: column.set_axis(index) for name, column in self._columns.items() if name in run._names}
+        return None if inplace else run
+
+    def _describe(self):
+        if self._names is None:
+            meta = self.cache.get_meta(self.filepath, **self.read_kwargs)
+            if meta is None:
+                run = Run.read_csv(self.filepath, name=self.name, description=self.description, cache=self.cache,
+                                   **self.read_kwargs)
+                meta = self.cache.get_meta(self.filepath, **self.read_kwargs)
+                if meta is None:
+                    # the CSV cannot be cached, so all of its columns are kept
+                    self._index = run.index
+                    self._columns = {name: run[name] for name in run.columns}
+                    self._names = list(run.columns)
+                    return self._names
+            self._index = self.cache.get_index(self.filepath, **self.read_kwargs)
+            self._names = list(meta['columns'])
+        return self._names
+
+    def _get_column(self, name):
+        if name not in self._describe():
+            raise KeyError(name)
+        if name not in self._columns:
+            values = self.cache.get_column(self.filepath, name, **self.read_kwargs)
+            if values is None:
+                raise OSError("The cached data of %s is no longer available, the CSV may have changed." % self.filepath)
+            self._columns[name] = Series(values, index=self.index, name=name, copy=False)
+        return self._columns[name]
 
 
 class RunSet(object):
 
-    def __init__(self, runs=[], name=None, description="", allow_overwrite=False):
+    def __init__(self, runs=[], name=None, description="", allow_overwrite=False, summary=None):
         self.runs = {}
 
         self.name = name if name is not None else uuid4()
         self.description = description
         self.allow_overwrite = allow_overwrite
+        # statistics of the runs for where, see RunSummary
+        self.summary = summary if summary is not None else RunSummary()
 
         for run in runs:
             self.add_run(run)
@@ -81,26 +406,197 @@ class RunSet(object):
     def __setitem__(self, key, value):
         for run in self.runs.values():
             run[key] = value
+        self.summary.clear()
 
     @property
     def run_names(self):
         return tuple(self.runs.keys())
 
+    @classmethod
+    def from_files(cls, filepaths, workers=None, processes=True, lazy=False, progress=None, cache=None, name=None,
+                   description="", allow_overwrite=False, summary=None, **kwargs):
+        """
+        Create a RunSet by reading in CSV files in parallel. See add_files.
+
+        Parameters
+        ----------
+        filepaths: str or list(str)
+            The CSV files, a glob pattern matching them or a directory containing them.
+        name: str or None, optional. Default=None.
+            Identifying name for the RunSet.
+        description: str, optional. Default="".
+            Additional details about the RunSet.
+        allow_overwrite: bool, optional. Default=False.
+            Allow a Run to replace an earlier Run with the same name.
+        summary: RunSummary or None, optional. Default=None.
+            Previously computed statistics of the Runs, e.g. from RunSummary.load. Only the statistics
+            of files which are not in the summary or have changed since are computed.
+
+        Returns
+        -------
+        runset: RunSet
+        """
+        runset = cls(name=name, description=description, allow_overwrite=allow_overwrite, summary=summary)
+        runset.add_files(filepaths, workers=workers, processes=processes, lazy=lazy, progress=progress, cache=cache,
+                         **kwargs)
+        return runset
+
+    def add_files(self, filepaths, workers=None, processes=True, lazy=False, progress=None, cache=None, **kwargs):
+        """
+        Read in CSV files in parallel and add them to the set as they are completed.
+
+        Each Run is named by its filepath. Name collisions with the Runs in the set or between the
+        files are checked before any file is read. If overwriting is allowed, repeated files are only
+        read once. The statistics of each file are added to the summary as it is read, unless they are
+        already in the summary and the file has not changed since.
+
+        Parameters
+        ----------
+        filepaths: str or list(str)
+            The CSV files, a glob pattern matching them or a directory containing them.
+        workers: int or None, optional. Default=None.
+            The number of files read at once. Defaults to the number of CPUs.
+        processes: bool, optional. Default=True.
+            Read the files in worker processes rather than threads.
+        lazy: bool, optional. Default=False.
+            Store the files in the cache and add them as LazyRuns rather than Runs.
+        progress: callable or None, optional. Default=None.
+            Called as progress(completed, total) each time a file has been read.
+        cache: RunCache or None, optional. Default=None.
+            A columnar cache of the CSV data, see Run.read_csv and LazyRun.
+        **kwargs
+            Arbitrary keyword arguments to be passed into Run.read_csv.
+        """
+        if isinstance(filepaths, str):
+            pattern = os.path.join(filepaths, '*.csv') if os.path.isdir(filepaths) else filepaths
+            filepaths = sorted(glob.glob(pattern))
+        cache = Run.DEFAULT_CACHE if cache is None else cache
+        if lazy and cache is None:
+            cache = RunCache()
+
+        # the runs are named by their filepaths, see Run.read_csv
+        files = []
+        for filepath in filepaths:
+            if filepath in self.runs or filepath in files:
+                if not self.allow_overwrite:
+                    raise ValueError("Cannot overwrite an existing Run with the same name: %s\n" % filepath +
+                                     "Either delete the run or set the RunSet's 'allow_overwrite' attribute to True.")
+                if filepath in files:
+                    continue
+            files.append(filepath)
+        if not files:
+            return
+
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with executor(max_workers=workers) as pool:
+            futures = {}
+            for filepath in files:
+                describe = not self.summary.is_current(filepath, filepath)
+                futures[pool.submit(self._read_file, filepath, cache, lazy, describe, kwargs)] = filepath
+            try:
+                for completed, future in enumerate(as_completed(futures), 1):
+                    filepath = futures[future]
+                    frame, statistics = future.result()
+                    if lazy:
+                        self.add_run(LazyRun(filepath, cache=cache, **kwargs))
+                    else:
+                        self.add_run(Run(frame, name=filepath, filepath=filepath, read_kwargs=kwargs))
+                    if statistics is not None:
+                        self.summary.add(filepath, statistics, filepath)
+                    if progress is not None:
+                        progress(completed, len(futures))
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
     def add_run(self, run):
         if run.name in self.runs and not self.allow_overwrite:
             raise ValueError("Cannot overwrite an existing Run with the same name: %s\n" % run.name +
                              "Either delete the run or set the RunSet's 'allow_overwrite' attribute to True.")
-        if not isinstance(run, Run):
+        if isinstance(run, RunHandle) and not isinstance(run, LazyRun):
+            # a plain handle cannot be changed in place, see set_index and __setitem__
+            run = run.load()
+        elif not isinstance(run, (Run, LazyRun)):
             run = Run(run)
 
+        # the statistics of a replaced run are outdated, unless they are of the same unchanged file
+        filepath = getattr(run, 'filepath', None)
+        if filepath is None or not self.summary.is_current(run.name, filepath):
+            self.summary.remove(run.name)
         self.runs[run.name] = run
 
     def remove_run(self, name):
         try:
             del(self.runs[name])
+            self.summary.remove(name)
         except KeyError:
             warnings.warn("Attempted to delete Run %s from RunSet %s but the run was not found." % (name, self.name))
 
     def set_index(self, keys, drop=False, append=False, verify_integrity=False):
         for run in self.runs.values():
             run.set_index(keys, drop=drop, inplace=True, append=append, verify_integrity=verify_integrity)
+        self.summary.clear()
+
+    def stack(self, columns=None):
+        """
+        Stack columns of all of the Runs for vectorized statistics across the Runs.
+
+        Parameters
+        ----------
+        columns: str or list(str) or None, optional. Default=None.
+            The columns to be stacked. Defaults to the numeric or boolean columns which all of the Runs have
+            in common.
+
+        Returns
+        -------
+        panel: RunPanel
+            The stacked columns, see RunPanel.
+        """
+        return RunPanel(self.runs.values(), columns)
+
+    def where(self, **conditions):
+        """
+        Find the Runs whose column statistics meet all of the conditions.
+
+        The conditions are evaluated on the summary, see RunSummary.query. The statistics of Runs which
+        are not in the summary yet are computed first, so only their data is read in.
+
+        Parameters
+        ----------
+        **conditions
+            Conditions of the form <statistic>__<column>__<operator>=value, e.g. max__B__gt=10.
+
+        Returns
+        -------
+        runset: RunSet
+            A RunSet of the Runs meeting the conditions.
+
+        Notes
+        -----
+        .. [1] Changes made to the Runs directly rather than through the RunSet are not seen by the summary.
+        """
+        for name, run in self.runs.items():
+            filepath = getattr(run, 'filepath', None)
+            if not self.summary.is_current(name, filepath):
+                self.summary.add(name, RunSummary.describe(self._read_data(run)), filepath)
+        matches = set(self.summary.query(**conditions))
+        names = [name for name in self.runs if name in matches]
+        return RunSet([self.runs[name] for name in names], description=self.description,
+                      allow_overwrite=self.allow_overwrite, summary=self.summary.subset(names))
+
+    @staticmethod
+    def _read_data(run):
+        # a lazy run is described from its own columns, which include those assigned through the set and its index,
+        # the columns of its file are only memory mapped
+        if isinstance(run, LazyRun):
+            return run.load()
+        return run
+
+    @staticmethod
+    def _read_file(filepath, cache, lazy, describe, kwargs):
+        # runs in a worker, the frame is returned without the Run attributes, which are not pickled
+        if lazy and not describe and cache.get_meta(filepath, **kwargs) is not None:
+            return None, None
+        frame = DataFrame(Run.read_csv(filepath, cache=cache, **kwargs), copy=False)
+        statistics = RunSummary.describe(frame) if describe else None
+        return (None if lazy else frame), statistics
@@ -0,0 +1,254 @@
+import json
+import operator
+import os
+
+import numpy as np
+
+from pandas import DataFrame, MultiIndex
+
+from ._names import decode_name, encode_name
+
+
+class RunSummary(object):
+    """
+    An index of summary statistics of the columns of many Runs, for finding Runs without their data.
+
+    The minimum, maximum, mean and count of every numeric column of each Run are stored by Run name.
+    The file a Run was read from is stored along with its modification time and size, so that the
+    statistics of a file which has since changed are known to be outdated.
+
+    Queries are given as keyword arguments of the form <statistic>__<column>__<operator>=value,
+    where the operator is one of gt, ge, lt, le, eq or ne, e.g. max__B__gt=10. See query.
+    """
+
+    STATISTICS = ('min', 'max', 'mean', 'count')
+
+    OPERATORS = {'gt': operator.gt,
+                 'ge': operator.ge,
+                 'lt': operator.lt,
+                 'le': operator.le,
+                 'eq': operator.eq,
+                 'ne': operator.ne}
+
+    def __init__(self):
+        self._rows = {}
+        self._sources = {}
+
+        self._table = None
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def names(self):
+        return tuple(self._rows)
+
+    @property
+    def table(self):
+        """
+        The statistics as a DataFrame indexed by Run name, with (statistic, column) columns.
+        """
+        if self._table is None:
+            keys = list(dict.fromkeys(key for row in self._rows.values() for key in row))
+            values = np.array([[row.get(key, np.nan) for key in keys] for row in self._rows.values()], dtype=float)
+            self._table = self._build_table(list(self._rows), keys, values)
+        return self._table
+
+    @classmethod
+    def describe(cls, frame):
+        """
+        Get the statistics of the numeric columns of a Run.
+
+        Parameters
+        ----------
+        frame: pandas.DataFrame
+            The data of the Run.
+
+        Returns
+        -------
+        statistics: dict
+            The value of each statistic, keyed by (statistic, column).
+        """
+        numeric = frame.select_dtypes(include='number')
+        if not len(numeric.columns):
+            return {}
+        stats = numeric.agg(list(cls.STATISTICS))
+        return {(stat, column): float(stats.at[stat, column]) for stat in cls.STATISTICS for column in stats.columns}
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Load a summary saved by RunSummary.save.
+
+        Parameters
+        ----------
+        filepath: str
+            The file to be loaded.
+
+        Returns
+        -------
+        summary: RunSummary
+        """
+        with np.load(filepath, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].item())
+            values = data['values']
+        summary = cls()
+        keys = [tuple(key) for key in meta['keys']]
+        for name, source, row in zip(map(decode_name, meta['names']), meta['sources'], values):
+            # missing statistics are kept as nan, as they are reported by the table
+            summary._rows[name] = dict(zip(keys, row.tolist()))
+            summary._sources[name] = None if source is None else tuple(source)
+        summary._table = cls._build_table(list(summary._rows), keys, values)
+        return summary
+
+    def add(self, name, statistics, filepath=None):
+        """
+        Add or replace the statistics of a Run.
+
+        Parameters
+        ----------
+        name: str
+            The name of the Run.
+        statistics: dict
+            The statistics of the Run, see describe.
+        filepath: str or None, optional. Default=None.
+            The file the Run was read from, if any.
+        """
+        self._rows[name] = dict(statistics)
+        self._sources[name] = None if filepath is None else self._source(filepath)
+        self._table = None
+
+    def clear(self):
+        """
+        Remove the statistics of all Runs.
+        """
+        self._rows.clear()
+        self._sources.clear()
+        self._table = None
+
+    def is_current(self, name, filepath=None):
+        """
+        Check whether the statistics of a Run are stored and up to date.
+
+        Parameters
+        ----------
+        name: str
+            The name of the Run.
+        filepath: str or None, optional. Default=None.
+            The file the Run is read from, if any.
+
+        Returns
+        -------
+        current: bool
+            False if the Run is not in the summary or was read from a different or changed file.
+        """
+        if name not in self._rows:
+            return False
+        source = self._sources[name]
+        if filepath is None or source is None:
+            return filepath is None and source is None
+        try:
+            return self._source(filepath) == source
+        except OSError:
+            return False
+
+    def query(self, **conditions):
+        """
+        Find the Runs whose statistics meet all of the conditions.
+
+        Parameters
+        ----------
+        **conditions
+            Conditions of the form <statistic>__<column>__<operator>=value, e.g. max__B__gt=10.
+            Runs without the column never meet the condition.
+
+        Returns
+        -------
+        names: list(str)
+            The names of the Runs meeting the conditions, in the order they were added.
+        """
+        table = self.table
+        mask = np.ones(len(table), dtype=bool)
+        for key, value in conditions.items():
+            stat, column, compare = self._parse_condition(key)
+            if (stat, column) not in table.columns:
+                return []
+            values = table[(stat, column)].to_numpy()
+            # missing statistics never meet a condition, including ne
+            mask &= ~np.isnan(values) & compare(values, value)
+        return table.index[mask].tolist()
+
+    def remove(self, name):
+        """
+        Remove the statistics of a Run, if present.
+
+        Parameters
+        ----------
+        name: str
+            The name of the Run.
+        """
+        self._rows.pop(name, None)
+        self._sources.pop(name, None)
+        self._table = None
+
+    def save(self, filepath):
+        """
+        Save the summary to an NPZ file.
+
+        Parameters
+        ----------
+        filepath: str
+            The file to be written. The .npz extension is appended if not present.
+
+        Raises
+        ------
+        ValueError
+            If a Run name is neither a str, int, float nor UUID, so it cannot be restored by load.
+        """
+        table = self.table
+        meta = {'names': [encode_name(name) for name in table.index],
+                'keys': [list(key) for key in table.columns],
+                'sources': [self._sources[name] for name in table.index]}
+        np.savez(filepath, meta=np.array(json.dumps(meta)), values=table.to_numpy())
+
+    def subset(self, names):
+        """
+        Get the summary of some of the Runs.
+
+        Parameters
+        ----------
+        names: list(str)
+            The names of the Runs.
+
+        Returns
+        -------
+        summary: RunSummary
+        """
+        summary = RunSummary()
+        for name in names:
+            if name in self._rows:
+                summary._rows[name] = self._rows[name]
+                summary._sources[name] = self._sources[name]
+        return summary
+
+    @staticmethod
+    def _build_table(names, keys, values):
+        columns = MultiIndex.from_tuples(keys, names=['statistic', 'column']) if keys else None
+        return DataFrame(values.reshape(len(names), len(keys)), index=names, columns=columns)
+
+    @classmethod
+    def _parse_condition(cls, key):
+        parts = key.split('__')
+        if len(parts) < 3 or parts[0] not in cls.STATISTICS or parts[-1] not in cls.OPERATORS:
+            raise ValueError("Invalid condition %s, conditions are of the form <statistic>__<column>__<operator> "
+                             "with a statistic in %s and an operator in %s." %
+                             (key, cls.STATISTICS, tuple(cls.OPERATORS)))
+        return parts[0], '__'.join(parts[1:-1]), cls.OPERATORS[parts[-1]]
+
+    @staticmethod
+    def _source(filepath):
+        stat = os.stat(filepath)
+        return os.path.normcase(os.path.abspath(filepath)), stat.st_mtime_ns, stat.st_size
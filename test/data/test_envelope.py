@@ -1,17 +1,32 @@
+import gc
 import os
 import sys
 
 import matplotlib.pyplot as plt
 import numpy as np
+import pickle
+import shutil
+import tempfile
 import unittest
+import warnings
+import weakref
+
+from uuid import uuid4
+
+from matplotlib.figure import Figure
+from matplotlib.path import Path
+from scipy.spatial import ConvexHull
 
 SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "pygui")
 if SRCDIR not in sys.path:
     sys.path.insert(0, SRCDIR)
 
-from data import Run
-from data.envelope import Envelope
-from data.envelope.mpi import MultiProcessEnvelopeGenerator
+from data import Run, RunHandle
+from data.envelope import AlphaEnvelope, Envelope, EnvelopeCache, EnvelopeSet, GridEnvelope, create_envelope
+from data.envelope._filter import akl_toussaint, hull_candidates
+from data.envelope._polygon import signed_area
+from data.envelope._simplify import simplify_polygon
+from data.envelope.mpi import MPI, MPIEnvelopeGenerator, MultiProcessEnvelopeGenerator
 
 
 class EnvelopeTestCase(unittest.TestCase):
@@ -29,6 +44,11 @@ class EnvelopeTestCase(unittest.TestCase):
     def setup_run2(self):
         return Run.read_csv(self.TEST_DATA2)
 
+    def setup_l_shaped_run(self):
+        points = np.random.default_rng(0).uniform(size=(20000, 2))
+        points = points[(points[:, 0] < 0.5) | (points[:, 1] < 0.5)]
+        return Run({'A': points[:, 0], 'B': points[:, 1]})
+
     def test_closed_vertices_envelope1(self):
         run = self.setup_run1()
         env = Envelope('A', 'B', [run])
@@ -46,6 +66,592 @@ class EnvelopeTestCase(unittest.TestCase):
         env = Envelope('A', 'B', [run1, run2])
         self.assertEqual(Envelope, type(env))
 
+    def test_envelope_indices_multiple_runs(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env = Envelope('A', 'B', [run1, run2])
+        self.assertEqual([2, 1, 0, 3, 0, 6], env.envelope_indices())
+        expected = [run1, run1, run2, run2, run1, run1]
+        self.assertTrue(all(a is b for a, b in zip(expected, env.envelope_runs())))
+
+    def test_refs_only_stored_for_vertices(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env = Envelope('A', 'B', [run1, run2])
+        self.assertEqual(len(env.points), len(env.refs))
+        for i, ref in enumerate(env.refs):
+            self.assertEqual(i in env.vertices, ref.run is not None)
+
+    def test_refs_keep_all(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env = Envelope('A', 'B', [run1, run2], keep_all=True)
+        self.assertEqual(list(range(8)) + list(range(6)), list(env.refs.indices))
+
+    def test_refs_run_table(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env = Envelope('A', 'B', [run1, run2], keep_all=True)
+        self.assertEqual(2, len(env.refs.run_table))
+        self.assertEqual([0] * 8 + [1] * 6, list(env.refs.run_ids))
+
+    def test_refs_index_labels(self):
+        run1 = self.setup_run1()
+        run1.set_index('TIME', inplace=True)
+        env = Envelope('A', 'B', run1)
+        self.assertAllClose([0.2, 0.1, 0.4, 0.5, 0.0, 0.6], env.envelope_indices())
+
+    def test_compact(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env = Envelope('A', 'B', [run1, run2])
+        env.compact()
+        self.assertEqual(6, env.npoints)
+        self.assertEqual(6, len(env.refs))
+        self.assertEqual([2, 1, 0, 3, 0, 6], env.envelope_indices())
+        self.assertAllClose(env.envelope_x(), [run[env.xname][i] for run, i in env.envelope_refs()])
+
+    def test_max_points_bounds_memory(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env1 = Envelope('A', 'B', [run1, run2, run1, run2])
+        env2 = Envelope('A', 'B', [run1, run2, run1, run2], max_points=8)
+        self.assertTrue(env2.npoints <= 8 + len(run1))
+        vertices1 = sorted(zip(env1.envelope_x(), env1.envelope_y(), env1.envelope_indices()))
+        vertices2 = sorted(zip(env2.envelope_x(), env2.envelope_y(), env2.envelope_indices()))
+        self.assertEqual(vertices1, vertices2)
+
+    def test_dropped_runs_are_released(self):
+        run1 = self.setup_run1()
+        # a square enclosing all of run1
+        run3 = Run({'A': [-100., 100., 100., -100.], 'B': [-100., -100., 100., 100.]})
+        env = Envelope('A', 'B', [run1, run3])
+        self.assertEqual(1, len(env.refs.run_table))
+        self.assertIs(run3, env.refs.run_table[0])
+        ref = weakref.ref(run1)
+        del run1
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_compact_prunes_run_table(self):
+        run1 = self.setup_run1()
+        run3 = Run({'A': [-100., 100., 100., -100.], 'B': [-100., -100., 100., 100.]})
+        env = Envelope('A', 'B', [run1, run3], max_points=4)
+        env.compact()
+        self.assertEqual(1, len(env.refs.run_table))
+        self.assertIs(run3, env.refs.run_table[0])
+        self.assertTrue(all(run is run3 for run in env.envelope_runs()))
+
+    def test_compact_keep_all_raises(self):
+        run1 = self.setup_run1()
+        env = Envelope('A', 'B', run1, keep_all=True)
+        with self.assertRaises(ValueError):
+            env.compact()
+
+    def test_add_points_refs(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env = Envelope('A', 'B', run1)
+        env.add_points(run2['A'], run2['B'], [run2] * len(run2), run2.index)
+        self.assertEqual([2, 1, 0, 3, 0, 6], env.envelope_indices())
+
+    def test_hull_candidates_keep_hull_vertices(self):
+        points = np.random.default_rng(0).normal(size=(10000, 2))
+        vertices = ConvexHull(points).vertices
+        self.assertTrue(set(vertices) <= set(akl_toussaint(points)))
+        self.assertEqual(set(vertices), set(hull_candidates(points)))
+
+    def test_prefilter(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env1 = Envelope('A', 'B', [run1, run2])
+        env2 = Envelope('A', 'B', [run1, run2], prefilter=True)
+        self.assertTrue(env2.npoints < env1.npoints)
+        vertices1 = sorted(zip(env1.envelope_x(), env1.envelope_y(), env1.envelope_indices()))
+        vertices2 = sorted(zip(env2.envelope_x(), env2.envelope_y(), env2.envelope_indices()))
+        self.assertEqual(vertices1, vertices2)
+
+    def test_from_file_chunked(self):
+        env1 = Envelope.from_file('A', 'B', self.TEST_DATA1)
+        env2 = Envelope.from_file('A', 'B', self.TEST_DATA1, chunksize=3)
+        vertices1 = sorted(zip(env1.envelope_x(), env1.envelope_y(), env1.envelope_indices()))
+        vertices2 = sorted(zip(env2.envelope_x(), env2.envelope_y(), env2.envelope_indices()))
+        self.assertEqual(vertices1, vertices2)
+        self.assertTrue(all(isinstance(run, RunHandle) for run in env2.envelope_runs()))
+
+    def test_from_file_small_chunks(self):
+        env1 = Envelope.from_file('A', 'B', self.TEST_DATA1)
+        for chunksize in (1, 2):
+            env2 = Envelope.from_file('A', 'B', self.TEST_DATA1, chunksize=chunksize)
+            vertices1 = sorted(zip(env1.envelope_x(), env1.envelope_y(), env1.envelope_indices()))
+            vertices2 = sorted(zip(env2.envelope_x(), env2.envelope_y(), env2.envelope_indices()))
+            self.assertEqual(vertices1, vertices2)
+
+    def test_from_file_chunked_degenerate(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "data.csv")
+        with open(filepath, 'w') as f:
+            f.write("A,B\n")
+        with self.assertRaises(ValueError):
+            Envelope.from_file('A', 'B', filepath, chunksize=2)
+        with open(filepath, 'a') as f:
+            f.write("1.,1.\n2.,2.\n3.,3.\n")
+        with self.assertRaises(ValueError):
+            Envelope.from_file('A', 'B', filepath, chunksize=2)
+
+    def test_from_file_chunked_run_data(self):
+        run = self.setup_run1()
+        env = Envelope.from_file('A', 'B', self.TEST_DATA1, chunksize=3)
+        c = [data['C'] for data in env.get_run_data('C')]
+        self.assertAllClose(run['C'][env.envelope_indices()], c)
+
+    def test_from_file_index_col_run_data(self):
+        run = self.setup_run1().set_index('TIME')
+        for chunksize in (None, 3):
+            env = Envelope.from_file('A', 'B', self.TEST_DATA1, chunksize=chunksize, run_kwargs={'index_col': 'TIME'})
+            self.assertAllClose([0.2, 0.1, 0.4, 0.5, 0.0, 0.6], env.envelope_indices())
+            c = [data['C'] for data in env.get_run_data('C')]
+            self.assertAllClose(run['C'][env.envelope_indices()], c)
+
+    def test_from_file_cache(self):
+        cache = EnvelopeCache(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache.directory)
+        env1 = Envelope.from_file('A', 'B', self.TEST_DATA1, cache=cache)
+        self.assertIsNotNone(cache.get(self.TEST_DATA1, 'A', 'B'))
+        self.assertIsNone(cache.get(self.TEST_DATA1, 'A', 'C'))
+        env2 = Envelope.from_file('A', 'B', self.TEST_DATA1, cache=cache)
+        self.assertTrue(all(isinstance(run, RunHandle) and not run.is_loaded for run in env2.envelope_runs()))
+        self.assertAllClose(env1.envelope_x(), env2.envelope_x())
+        self.assertAllClose(env1.envelope_y(), env2.envelope_y())
+        self.assertEqual(env1.envelope_indices(), env2.envelope_indices())
+
+    def test_from_file_cache_read_kwargs(self):
+        cache = EnvelopeCache(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache.directory)
+        env1 = Envelope.from_file('A', 'B', self.TEST_DATA1, cache=cache)
+        self.assertIsNone(cache.get(self.TEST_DATA1, 'A', 'B', index_col='TIME'))
+        env2 = Envelope.from_file('A', 'B', self.TEST_DATA1, cache=cache, run_kwargs={'index_col': 'TIME'})
+        env3 = Envelope.from_file('A', 'B', self.TEST_DATA1, cache=cache, run_kwargs={'index_col': 'TIME'})
+        self.assertEqual(2, len(cache._entries()))
+        self.assertEqual([2, 1, 4, 5, 0, 6], env1.envelope_indices())
+        self.assertAllClose([0.2, 0.1, 0.4, 0.5, 0.0, 0.6], env3.envelope_indices())
+        self.assertAllClose(env2.get_run_data('C'), env3.get_run_data('C'))
+        self.assertFalse(cache.put(self.TEST_DATA1, 'A', 'B', [1.], [2.], [0], dtype=np.float32))
+        self.assertIsNone(cache.get(self.TEST_DATA1, 'A', 'B', dtype=np.float32))
+
+    def test_cache_invalidated_by_file_change(self):
+        cache = EnvelopeCache(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache.directory)
+        filepath = os.path.join(cache.directory, "data.csv")
+        shutil.copy(self.TEST_DATA1, filepath)
+        Envelope.from_file('A', 'B', filepath, cache=cache)
+        self.assertIsNotNone(cache.get(filepath, 'A', 'B'))
+        shutil.copy(self.TEST_DATA2, filepath)
+        self.assertIsNone(cache.get(filepath, 'A', 'B'))
+        env = Envelope.from_file('A', 'B', filepath, cache=cache)
+        self.assertEqual([0, 2, 3, 5], sorted(env.envelope_indices()))
+        self.assertEqual(1, len(cache._entries()))
+        cache.invalidate(filepath)
+        self.assertIsNone(cache.get(filepath, 'A', 'B'))
+
+    def test_cache_eviction(self):
+        cache = EnvelopeCache(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache.directory)
+        Envelope.from_file('A', 'B', self.TEST_DATA1, cache=cache)
+        cache.max_size = cache.size
+        os.utime(cache._entries()[0], (0, 0))
+        Envelope.from_file('A', 'B', self.TEST_DATA2, cache=cache)
+        self.assertIsNone(cache.get(self.TEST_DATA1, 'A', 'B'))
+        self.assertIsNotNone(cache.get(self.TEST_DATA2, 'A', 'B'))
+
+    def test_cache_skips_object_indices(self):
+        cache = EnvelopeCache(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache.directory)
+        self.assertFalse(cache.put(self.TEST_DATA1, 'A', 'B', [1., 2.], [3., 4.], ['a', 'b']))
+        self.assertEqual([], cache._entries())
+        self.assertTrue(cache.put(self.TEST_DATA1, 'A', 'B', [1., 2.], [3., 4.], [0.1, 0.2]))
+        self.assertAllClose([0.1, 0.2], cache.get(self.TEST_DATA1, 'A', 'B')[2])
+
+    def test_multiprocess_enveloper_cache(self):
+        cache = EnvelopeCache(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache.directory)
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2]
+        with MultiProcessEnvelopeGenerator(ncpus=2, cache=cache) as mpeg:
+            env1 = mpeg.compute_envelope('A', 'B', filepaths)
+            self.assertEqual(2, len(cache._entries()))
+            env2 = mpeg.compute_envelope('A', 'B', filepaths)
+        self.assertEqual(sorted(env1.envelope_indices()), sorted(env2.envelope_indices()))
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "envelope.npz")
+        env1 = Envelope('A', 'B', [self.setup_run1(), self.setup_run2()], name="env", max_points=20)
+        env1.save(filepath)
+        env2 = Envelope.load(filepath)
+        self.assertEqual("env", env2.name)
+        self.assertEqual(20, env2.max_points)
+        self.assertEqual(len(env1.vertices), env2.npoints)
+        self.assertEqual(sorted(zip(env1.envelope_x(), env1.envelope_y(), env1.envelope_indices())),
+                         sorted(zip(env2.envelope_x(), env2.envelope_y(), env2.envelope_indices())))
+        runs = env2.envelope_runs()
+        self.assertTrue(all(isinstance(run, RunHandle) and not run.is_loaded for run in runs))
+        self.assertEqual({self.TEST_DATA1, self.TEST_DATA2}, set(run.filepath for run in runs))
+        self.assertAllClose(env1.get_run_data('C'), env2.get_run_data('C'))
+
+    def test_save_load_keep_all(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "envelope.npz")
+        run = self.setup_run1()
+        env1 = Envelope('A', 'B', run, keep_all=True)
+        env1.save(filepath)
+        env2 = Envelope.load(filepath, runs={run.name: run})
+        self.assertEqual(env1.npoints, env2.npoints)
+        self.assertEqual(list(env1.refs), list(env2.refs))
+
+    def test_save_load_unnamed_run(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "envelope.npz")
+        env1 = Envelope('A', 'B', Run({'A': [0, 2, 2, 0, 1], 'B': [0, 0, 2, 2, 1]}))
+        env1.save(filepath)
+        env2 = Envelope.load(filepath)
+        self.assertEqual([None] * 4, env2.envelope_runs())
+        self.assertEqual([(None, None)] * 4, [env2.refs[i] for i in env2.vertices])
+
+    def test_save_load_uuid_names(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "envelope.npz")
+        run = self.setup_run1()
+        run.name = uuid4()
+        env1 = Envelope('A', 'B', run)
+        env1.save(filepath)
+        env2 = Envelope.load(filepath, runs={run.name: run})
+        self.assertEqual(env1.name, env2.name)
+        self.assertTrue(all(r is run for r in env2.envelope_runs()))
+        env3 = Envelope.load(filepath)
+        self.assertEqual(run.name, env3.envelope_runs()[0].name)
+        run.name = ('run', 1)
+        with self.assertRaises(ValueError):
+            Envelope('A', 'B', run).save(filepath)
+
+    def test_save_load_index_col(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "envelope.npz")
+        env1 = Envelope('A', 'B', Run.read_csv(self.TEST_DATA1, index_col='TIME'))
+        env1.save(filepath)
+        env2 = Envelope.load(filepath)
+        self.assertEqual({'index_col': 'TIME'}, env2.envelope_runs()[0].read_kwargs)
+        self.assertAllClose(env1.envelope_indices(), env2.envelope_indices())
+        self.assertAllClose(env1.get_run_data('C'), env2.get_run_data('C'))
+
+    def test_save_load_unsaveable_read_kwargs(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "envelope.npz")
+        env1 = Envelope.from_file('A', 'B', self.TEST_DATA1, run_kwargs={'dtype': np.float32}, chunksize=10)
+        with self.assertWarns(UserWarning):
+            env1.save(filepath)
+        env2 = Envelope.load(filepath, run_kwargs={'usecols': ['A', 'B']})
+        run = env2.envelope_runs()[0]
+        self.assertEqual({'usecols': ['A', 'B']}, run.read_kwargs)
+        self.assertAllClose(env1.envelope_x(), env2.envelope_x())
+
+    def test_envelope_set_full_envelope(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env1 = Envelope('A', 'B', run1)
+        env2 = Envelope('A', 'B', run2)
+        envset = EnvelopeSet([env1, env2], name='set')
+        expected = Envelope('A', 'B', [run1, run2])
+        full = envset.full_envelope
+        self.assertEqual('set', full.name)
+        self.assertEqual(sorted(zip(expected.envelope_x(), expected.envelope_y(), expected.envelope_indices())),
+                         sorted(zip(full.envelope_x(), full.envelope_y(), full.envelope_indices())))
+        # the referenced runs are shared with the member envelopes rather than copied
+        self.assertTrue(all(run is run1 or run is run2 for run in full.envelope_runs()))
+        self.assertEqual(8, env1.npoints)
+
+    def test_envelope_set_mixed_keep_all(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env1 = Envelope('A', 'B', run1, keep_all=True)
+        env2 = Envelope('A', 'B', run2)
+        full = EnvelopeSet([env1, env2]).full_envelope
+        # only the vertices of env2 have references, its interior points are not exported
+        self.assertEqual(env1.npoints + len(env2.vertices), full.npoints)
+        self.assertTrue(all(ref.run is not None for ref in full.refs))
+
+    def test_envelope_set_empty(self):
+        env1 = Envelope('A', 'B', self.setup_run1())
+        envset = EnvelopeSet(env1)
+        self.assertIsNotNone(envset.full_envelope)
+        envset.remove_envelopes(env1)
+        self.assertIsNone(envset.full_envelope)
+        self.assertEqual([], envset.envelope_sources())
+        self.assertIsNone(EnvelopeSet([]).full_envelope)
+
+    def test_envelope_set_add_envelopes(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        envset = EnvelopeSet(Envelope('A', 'B', run1))
+        envset.add_envelopes(Envelope('A', 'B', run2))
+        self.assertEqual(2, len(envset.envelopes))
+        expected = Envelope('A', 'B', [run1, run2])
+        self.assertAllClose(sorted(expected.envelope_x()), sorted(envset.full_envelope.envelope_x()))
+
+    def test_envelope_set_is_lazy(self):
+        envset = EnvelopeSet([Envelope('A', 'B', self.setup_run1()), Envelope('A', 'B', self.setup_run2())])
+        self.assertIsNone(envset._full_envelope)
+        envset.add_envelopes(Envelope('A', 'B', self.setup_run1()))
+        self.assertIsNone(envset._full_envelope)
+        self.assertEqual(6, len(envset.full_envelope.vertices))
+
+    def test_envelope_set_sources(self):
+        env1 = Envelope('A', 'B', self.setup_run1())
+        env2 = Envelope('A', 'B', self.setup_run2())
+        envset = EnvelopeSet([env1, env2])
+        expected = [env1 if run is env1.refs.run_table[0] else env2 for run in envset.full_envelope.envelope_runs()]
+        self.assertEqual(expected, envset.envelope_sources())
+        env3 = Envelope('A', 'B', self.setup_run2())
+        envset.add_envelopes(env3)
+        self.assertFalse(any(env is env3 for env in envset.envelope_sources()))
+        self.assertEqual(7, len(envset.envelope_sources(closed=True)))
+
+    def test_envelope_set_remove_envelopes(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env1 = Envelope('A', 'B', run1)
+        env2 = Envelope('A', 'B', run2)
+        env3 = Envelope('A', 'B', Run({'A': [4., 5., 4.5], 'B': [4., 4., 5.]}))
+        envset = EnvelopeSet([env1, env2, env3])
+        full = envset.full_envelope
+
+        # env3 lies inside the others, so removing it leaves the full envelope in place
+        envset.remove_envelopes(env3)
+        self.assertTrue(full is envset.full_envelope)
+        self.assertTrue(all(env is env1 or env is env2 for env in envset.envelope_sources()))
+
+        envset.remove_envelopes(env2)
+        self.assertFalse(full is envset.full_envelope)
+        self.assertAllClose(sorted(env1.envelope_x()), sorted(envset.full_envelope.envelope_x()))
+        self.assertEqual([env1] * 6, envset.envelope_sources())
+
+    def setup_square_envelope(self):
+        run = Run({'A': [0., 2., 2., 0., 1.], 'B': [0., 0., 2., 2., 1.]})
+        return Envelope('A', 'B', run)
+
+    def test_perimeter_cached(self):
+        env = Envelope('A', 'B', self.setup_run1())
+        self.assertIs(env.perimeter, env.perimeter)
+        self.assertIs(env.closed_vertices, env.closed_vertices)
+        self.assertFalse(env.perimeter.flags.writeable)
+        env.add_run(self.setup_run2())
+        self.assertAllClose(env.points[np.hstack([env.vertices, env.vertices[:1]])], env.perimeter)
+
+    def test_simplify_polygon(self):
+        angles = np.linspace(0., 2. * np.pi, 1000, endpoint=False)
+        points = np.column_stack([np.cos(angles), 2. * np.sin(angles)])
+        positions = simplify_polygon(points, 0.01)
+        self.assertTrue(len(positions) < 100)
+        for extremes in (points.argmin(axis=0), points.argmax(axis=0)):
+            self.assertTrue(set(extremes) <= set(positions))
+        # every discarded vertex lies within the tolerance of the simplified polygon
+        simplified = Envelope('x', 'y', Run({'x': points[positions, 0], 'y': points[positions, 1]}))
+        self.assertTrue(simplified.distance_to_boundary(points[:, 0], points[:, 1]).max() <= 0.01)
+        self.assertEqual(len(points), len(simplify_polygon(points, 0.)))
+
+    def test_simplified_vertices(self):
+        x, y = np.random.default_rng(0).normal(size=(2, 10000))
+        env = Envelope('A', 'B', Run({'A': x, 'B': y}))
+        vertices = env.simplified_vertices(0.1)
+        self.assertTrue(set(vertices) < set(env.vertices))
+        self.assertEqual(vertices[0], env.simplified_vertices(0.1, closed=True)[-1])
+        self.assertIs(env.simplified_vertices(0.1, closed=True), env.simplified_vertices(0.1, closed=True))
+        self.assertAllClose([x.min(), x.max()], [env.points[vertices, 0].min(), env.points[vertices, 0].max()])
+
+    def test_envelope_set_plot(self):
+        env1 = Envelope('A', 'B', self.setup_run1())
+        env2 = Envelope('A', 'B', self.setup_run2())
+        ax = Figure().add_subplot(111)
+        EnvelopeSet([env1, env2]).plot(ax, full=True)
+        self.assertEqual(2, len(ax.lines))
+        x = ax.lines[0].get_xdata()
+        self.assertEqual(len(env1.closed_vertices) + len(env2.closed_vertices) + 1, len(x))
+        self.assertEqual(1, np.isnan(x).sum())
+
+    def test_alpha_envelope_follows_concave_region(self):
+        run = self.setup_l_shaped_run()
+        alpha = AlphaEnvelope('A', 'B', run)
+        convex = Envelope('A', 'B', run)
+        self.assertAlmostEqual(0.75, signed_area(alpha.perimeter[:-1]), delta=0.02)
+        self.assertTrue(signed_area(alpha.perimeter[:-1]) < signed_area(convex.perimeter[:-1]))
+        self.assertEqual([True, True, False], list(alpha.contains([0.25, 0.75, 0.8], [0.75, 0.25, 0.8])))
+        self.assertTrue(alpha.contains(alpha.envelope_x(), alpha.envelope_y()).all())
+        self.assertTrue(alpha.distance_to_boundary(0.8, 0.8) > 0.)
+        exact = AlphaEnvelope('A', 'B', run, resolution=None)
+        self.assertTrue(exact.contains(run['A'], run['B']).all())
+        self.assertAlmostEqual(signed_area(exact.perimeter[:-1]), signed_area(alpha.perimeter[:-1]), delta=0.01)
+
+    def test_alpha_envelope_refs(self):
+        run = self.setup_l_shaped_run()
+        env = AlphaEnvelope('A', 'B', run)
+        self.assertEqual(len(run), len(env.refs))
+        self.assertTrue(all(r is run for r in env.envelope_runs()))
+        self.assertAllClose(run['A'][env.envelope_indices()], env.envelope_x())
+        self.assertAllClose(run['B'][env.envelope_indices()], env.envelope_y())
+
+    def test_alpha_envelope_add_run(self):
+        run = self.setup_l_shaped_run()
+        env = AlphaEnvelope('A', 'B', run)
+        perimeter = env.perimeter
+        report = env.add_run(Run({'A': [0.25, 1.01], 'B': [0.25, 0.25]}), report=True)
+        self.assertEqual([1], list(report.indices))
+        self.assertIsNot(perimeter, env.perimeter)
+        self.assertTrue(env.contains(1.01, 0.25))
+
+    def test_envelope_set_alpha_members(self):
+        run = self.setup_l_shaped_run()
+        envelopes = [AlphaEnvelope('A', 'B', run.iloc[:5000], alpha=0.1),
+                     AlphaEnvelope('A', 'B', run.iloc[5000:], alpha=0.1)]
+        full = EnvelopeSet(envelopes).full_envelope
+        self.assertIs(AlphaEnvelope, type(full))
+        self.assertEqual(0.1, full.alpha)
+        self.assertEqual(len(run), full.npoints)
+
+    def test_grid_envelope_occupancy(self):
+        run = Run({'A': [0.5, 0.6, 1.5, 3.5, 3.5], 'B': [0.5, 0.7, 0.5, 3.5, 4.]})
+        env = GridEnvelope('A', 'B', run, (0., 4.), (0., 4.), shape=(4, 4))
+        self.assertEqual(3, env.npoints)
+        self.assertEqual([(0, 0), (1, 0), (3, 3)], [tuple(c) for c in np.argwhere(env.occupancy)])
+        # the first point seen in each cell is kept
+        self.assertEqual([0, 2, 3], list(env.refs.indices))
+
+    def test_grid_envelope_outline(self):
+        run = self.setup_l_shaped_run()
+        env = GridEnvelope('A', 'B', run, (0., 1.), (0., 1.), shape=(64, 64))
+        convex = Envelope('A', 'B', run)
+        self.assertAlmostEqual(0.75, signed_area(env.perimeter[:-1]), delta=0.05)
+        self.assertTrue(signed_area(env.perimeter[:-1]) < signed_area(convex.perimeter[:-1]))
+        self.assertEqual([True, True, False], list(env.contains([0.25, 0.75, 0.8], [0.75, 0.25, 0.8])))
+        self.assertTrue(all(r is run for r in env.envelope_runs()))
+        self.assertAllClose(run['A'][env.envelope_indices()], env.envelope_x())
+
+    def test_grid_envelope_outside_limits_warns(self):
+        run = Run({'A': [0.5, 1.5, 5.], 'B': [0.5, 0.5, 0.5]})
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            env = GridEnvelope('A', 'B', run, (0., 4.), (0., 4.), shape=(4, 4))
+        self.assertEqual(1, len(caught))
+        self.assertEqual(2, env.npoints)
+
+    def test_grid_envelope_merge(self):
+        run = self.setup_l_shaped_run()
+        run1, run2 = run.iloc[:6000], run.iloc[6000:]
+        env = GridEnvelope('A', 'B', [run1, run2], (0., 1.), (0., 1.), shape=(64, 64))
+        env1 = GridEnvelope('A', 'B', run1, (0., 1.), (0., 1.), shape=(64, 64))
+        env2 = GridEnvelope('A', 'B', run2, (0., 1.), (0., 1.), shape=(64, 64))
+        env1.absorb_envelopes(env2)
+        self.assertTrue(np.array_equal(env.occupancy, env1.occupancy))
+        self.assertTrue(np.array_equal(env.points, env1.points))
+        self.assertEqual(env.envelope_indices(), env1.envelope_indices())
+
+    def test_envelope_set_grid_members(self):
+        run = self.setup_l_shaped_run()
+        envelopes = [GridEnvelope('A', 'B', run.iloc[:6000], (0., 1.), (0., 1.), shape=(64, 64)),
+                     GridEnvelope('A', 'B', run.iloc[6000:], (0., 1.), (0., 1.), shape=(64, 64))]
+        envelope_set = EnvelopeSet(envelopes)
+        full = envelope_set.full_envelope
+        self.assertTrue(np.array_equal(envelopes[0].occupancy | envelopes[1].occupancy, full.occupancy))
+        self.assertEqual(full.npoints, len(envelope_set._sources))
+        sources = envelope_set.envelope_sources()
+        self.assertTrue(all(any(run is env.refs.run_table[0] for env in sources) for run in full.envelope_runs()))
+
+    def test_envelope_set_remove_grid_member(self):
+        xs, ys = np.meshgrid(np.arange(5) + 0.5, np.arange(5) + 0.5)
+        ring = (xs < 1) | (xs > 4) | (ys < 1) | (ys > 4)
+        env1 = GridEnvelope('A', 'B', Run({'A': xs[ring], 'B': ys[ring]}), (0., 10.), (0., 10.), shape=(10, 10))
+        # env2 fills the hole of the ring, so none of the vertices of the full envelope come from it
+        env2 = GridEnvelope('A', 'B', Run({'A': xs[~ring], 'B': ys[~ring]}), (0., 10.), (0., 10.), shape=(10, 10))
+        envset = EnvelopeSet([env1, env2])
+        self.assertEqual(25, envset.full_envelope.occupancy.sum())
+        envset.remove_envelopes(env2)
+        self.assertTrue(np.array_equal(env1.occupancy, envset.full_envelope.occupancy))
+        env3 = GridEnvelope('A', 'B', Run({'A': np.arange(5) + 4.5, 'B': np.full(5, 2.5)}), (0., 10.), (0., 10.),
+                            shape=(10, 10))
+        envset.add_envelopes(env3)
+        self.assertEqual(20, envset.full_envelope.occupancy.sum())
+        self.assertTrue(all(env is env1 or env is env3 for env in envset.envelope_sources()))
+
+    def test_refs_pickle(self):
+        run1 = self.setup_run1()
+        env = Envelope('A', 'B', run1, keep_all=True)
+        refs = pickle.loads(pickle.dumps(env.refs))
+        run = refs.run_table[0]
+        refs.extend(run, [0])
+        self.assertEqual(1, len(refs.run_table))
+
+    def test_create_envelope_engine(self):
+        run = self.setup_run1()
+        self.assertIs(Envelope, type(create_envelope('A', 'B', run)))
+        self.assertIs(AlphaEnvelope, type(create_envelope('A', 'B', self.setup_l_shaped_run(), engine='alpha')))
+        with self.assertRaises(ValueError):
+            create_envelope('A', 'B', run, engine='unknown')
+
+    def test_contains(self):
+        env = self.setup_square_envelope()
+        self.assertTrue(env.contains(1., 1.))
+        self.assertFalse(env.contains(3., 1.))
+        self.assertTrue(env.contains(2.5, 1., tolerance=0.5))
+        inside = env.contains([1., 0.5, 3., -1., 2.], [1., 1.9, 1., -1., 2.])
+        self.assertEqual([True, True, False, False, True], inside.tolist())
+
+    def test_contains_tolerance_at_vertex(self):
+        env = self.setup_square_envelope()
+        # 0.3 from both facet lines through the corner (2, 2), but 0.42 from the corner itself
+        self.assertFalse(env.contains(2.3, 2.3, tolerance=0.35))
+        self.assertTrue(env.contains(2.3, 2.3, tolerance=0.45))
+        inside = env.contains([2.3, 2.3, 1.], [2.3, 1., 2.3], tolerance=0.35)
+        self.assertEqual([False, True, True], inside.tolist())
+
+    def test_contains_matches_path(self):
+        run1 = self.setup_run1()
+        run2 = self.setup_run2()
+        env = Envelope('A', 'B', [run1, run2])
+        points = np.random.default_rng(0).uniform(0., 10., size=(10000, 2))
+        expected = Path(env.perimeter).contains_points(points)
+        self.assertEqual(expected.tolist(), env.contains(points[:, 0], points[:, 1]).tolist())
+
+    def test_distance_to_boundary(self):
+        env = self.setup_square_envelope()
+        distance = env.distance_to_boundary([1., 1.5, 3., 3., 1.], [1., 1., 1., 3., 2.])
+        self.assertAllClose([-1., -0.5, 1., np.sqrt(2.), 0.], distance)
+        self.assertAllClose(1., env.distance_to_boundary(1., -1.))
+
+    def test_add_run_exceedance_report(self):
+        run = Run({'A': [3., 1., 4., 2.], 'B': [1., 1., 4., 0.]})
+        for prefilter in (False, True):
+            env = self.setup_square_envelope()
+            env.prefilter = prefilter
+            report = env.add_run(run, report=True)
+            self.assertTrue(report.run is run)
+            self.assertEqual([0, 2], report.indices.tolist())
+            self.assertAllClose([1., np.sqrt(8.)], report.distances)
+            self.assertAllClose(np.sqrt(8.), report.max_distance)
+            self.assertEqual([0, 1, 3], sorted(i for r, i in env.envelope_refs() if r is not run))
+            self.assertEqual([0, 2], sorted(i for r, i in env.envelope_refs() if r is run))
+
+    def test_add_run_no_exceedance(self):
+        env = self.setup_square_envelope()
+        self.assertIsNone(env.add_run(Run({'A': [1., 1.5], 'B': [1., 1.5]})))
+        report = env.add_run(Run({'A': [1., 1.5], 'B': [1., 1.5]}), report=True)
+        self.assertEqual(0, len(report.indices))
+        self.assertEqual(0., report.max_distance)
+
     @unittest.skip
     def test_envelope_indices_1(self):
         run = self.setup_run1()
@@ -117,10 +723,130 @@ class EnvelopeTestCase(unittest.TestCase):
         env1.plot(ax)
         plt.show()
 
+    def test_multiprocess_enveloper_no_files(self):
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            with self.assertRaises(ValueError):
+                mpeg.compute_envelope('A', 'B', [])
+            with self.assertRaises(ValueError):
+                mpeg.compute_envelope('A', 'B', [], keep_all=True)
+            with self.assertRaises(ValueError):
+                mpeg.compute_grid_envelope('A', 'B', [], (0., 10.), (0., 10.))
+
+    def test_multiprocess_enveloper_matches_serial(self):
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2, self.TEST_DATA1, self.TEST_DATA2, self.TEST_DATA1]
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            env1 = mpeg.compute_envelope('A', 'B', filepaths)
+        env2 = Envelope('A', 'B', [self.setup_run1(), self.setup_run2()])
+        self.assertAllClose(sorted(env1.envelope_x()), sorted(env2.envelope_x()))
+        self.assertAllClose(sorted(env1.envelope_y()), sorted(env2.envelope_y()))
+        self.assertEqual(sorted(env1.envelope_indices()), sorted(env2.envelope_indices()))
+
+    def test_multiprocess_enveloper_returns_run_handles(self):
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2]
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            env = mpeg.compute_envelope('A', 'B', filepaths)
+        runs = env.envelope_runs()
+        self.assertTrue(all(isinstance(run, RunHandle) for run in runs))
+        self.assertFalse(any(run.is_loaded for run in runs))
+        data = env.get_run_data(['A', 'B'])
+        self.assertFalse(any(run.is_loaded for run in runs))
+        self.assertAllClose(env.envelope_x(), [row['A'] for row in data])
+        self.assertAllClose(env.envelope_y(), [row['B'] for row in data])
+
+    def test_multiprocess_enveloper_submit(self):
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2]
+        calls = []
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            future1 = mpeg.submit('A', 'B', filepaths, progress=lambda *args: calls.append(args))
+            future2 = mpeg.submit('A', 'B', filepaths[:1])
+            pool = mpeg.pool
+            env1 = future1.result()
+            env2 = future2.result()
+            self.assertTrue(pool is mpeg.pool)
+        self.assertEqual([(1, 2), (2, 2)], calls)
+        self.assertEqual(6, len(env1.vertices))
+        self.assertEqual({0, 1, 2, 4, 5, 6}, set(env2.envelope_indices()))
+        self.assertTrue(mpeg._pool is None)
+
+    def test_multiprocess_enveloper_multiple_names(self):
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2, self.TEST_DATA1]
+        names = [('A', 'B'), ('A', 'C'), ('D', 'B')]
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            envs = mpeg.compute_envelopes(names, filepaths)
+        self.assertEqual(names, list(envs.keys()))
+        for xname, yname in names:
+            env = envs[(xname, yname)]
+            expected = Envelope(xname, yname, [self.setup_run1(), self.setup_run2()])
+            self.assertEqual((xname, yname), (env.xname, env.yname))
+            self.assertEqual(sorted(zip(expected.envelope_x(), expected.envelope_y(), expected.envelope_indices())),
+                             sorted(zip(env.envelope_x(), env.envelope_y(), env.envelope_indices())))
+
+    def test_multiprocess_enveloper_keep_all(self):
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2]
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            env = mpeg.compute_envelope('A', 'B', filepaths, keep_all=True)
+        expected = Envelope('A', 'B', [self.setup_run1(), self.setup_run2()], keep_all=True)
+        self.assertTrue(env.keep_all)
+        self.assertEqual(14, env.npoints)
+        self.assertEqual(sorted(zip(expected.points[:, 0], expected.points[:, 1], expected.refs.indices)),
+                         sorted(zip(env.points[:, 0], env.points[:, 1], env.refs.indices)))
+        self.assertEqual({self.TEST_DATA1, self.TEST_DATA2}, {run.filepath for run in env.refs.runs})
+        self.assertAllClose(sorted(expected.envelope_x()), sorted(env.envelope_x()))
+
+    def test_multiprocess_enveloper_submit_keep_all(self):
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            env = mpeg.submit('A', 'B', [self.TEST_DATA1, self.TEST_DATA2], keep_all=True).result()
+        self.assertTrue(env.keep_all)
+        self.assertEqual(14, env.npoints)
+
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), "shared memory blocks are not listed in /dev/shm")
+    def test_multiprocess_enveloper_keep_all_failure_unlinks(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, 'text.csv')
+        with open(filepath, 'w') as f:
+            f.write('A,B,S\n1.,2.,x\n3.,4.,y\n')
+        before = set(os.listdir('/dev/shm'))
+        # the second pair of the file fails after the block of the first pair was created
+        with self.assertRaises(ValueError):
+            MultiProcessEnvelopeGenerator.share_points([('A', 'B'), ('A', 'S')], filepath)
+        self.assertEqual(before, set(os.listdir('/dev/shm')))
+        # the other files are still being read when the text file fails
+        filepath = os.path.join(directory, 'text_b.csv')
+        with open(filepath, 'w') as f:
+            f.write('A,B\n1.,x\n3.,y\n')
+        filepaths = [filepath, self.TEST_DATA1, self.TEST_DATA2, self.TEST_DATA1]
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            with self.assertRaises(ValueError):
+                mpeg.compute_envelope('A', 'B', filepaths, keep_all=True)
+        self.assertEqual(before, set(os.listdir('/dev/shm')))
+
+    def test_multiprocess_grid_envelope(self):
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2]
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            env1 = mpeg.compute_grid_envelope('A', 'B', filepaths, (0., 10.), (0., 10.), shape=(10, 10))
+        env2 = GridEnvelope('A', 'B', [self.setup_run1(), self.setup_run2()], (0., 10.), (0., 10.), shape=(10, 10))
+        self.assertTrue(np.array_equal(env1.occupancy, env2.occupancy))
+        self.assertEqual(env1.envelope_indices(), env2.envelope_indices())
+        self.assertTrue(all(isinstance(run, RunHandle) for run in env1.envelope_runs()))
+
+    @unittest.skipIf(MPI is None, "mpi4py is not installed")
+    def test_mpi_enveloper(self):
+        # also runs distributed, e.g. mpirun -n 4 python -m pytest test/data/test_envelope.py -k mpi
+        filepaths = [self.TEST_DATA1, self.TEST_DATA2, self.TEST_DATA1, self.TEST_DATA2, self.TEST_DATA1]
+        generator = MPIEnvelopeGenerator()
+        env1 = generator.compute_envelope('A', 'B', filepaths)
+        if generator.rank != generator.root:
+            self.assertIsNone(env1)
+        else:
+            env2 = Envelope('A', 'B', [self.setup_run1(), self.setup_run2()])
+            self.assertAllClose(sorted(env1.envelope_x()), sorted(env2.envelope_x()))
+            self.assertEqual(sorted(env1.envelope_indices()), sorted(env2.envelope_indices()))
+
     def test_multiprocess_enveloper(self):
         filepaths = [self.TEST_DATA1, self.TEST_DATA2]
-        mpeg = MultiProcessEnvelopeGenerator(ncpus=2)
-        env = mpeg.compute_envelope('A', 'B', filepaths)
+        with MultiProcessEnvelopeGenerator(ncpus=2) as mpeg:
+            env = mpeg.compute_envelope('A', 'B', filepaths)
         ax = plt.subplot(111, projection='pickable')
         ax.options.annotation_data = ['C', 'D']
         env.plot(ax)
@@ -2,14 +2,19 @@ import os
 import sys
 
 import numpy as np
+import pickle
 import pandas as pd
+import shutil
+import tempfile
 import unittest
 
+from uuid import uuid4
+
 SRCDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "pygui")
 if SRCDIR not in sys.path:
     sys.path.insert(0, SRCDIR)
 
-from data import Run, RunSet
+from data import LazyRun, Run, RunCache, RunHandle, RunPanel, RunSet, RunSummary
 
 
 class RunDataTestCase(unittest.TestCase):
@@ -97,6 +102,384 @@ class RunDataTestCase(unittest.TestCase):
         expected = [0., 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7]
         self.assertAllClose(expected, indices)
 
+    def test_RunHandle_is_lazy(self):
+        handle = RunHandle(self.TEST_DATA_FILEPATH)
+        self.assertFalse(handle.is_loaded)
+        self.assertAllClose([1., 9., 6., 4., 7., 3., 5., 4.], handle['A'].tolist())
+        self.assertTrue(handle.is_loaded)
+
+    def test_RunHandle_pickle_drops_run(self):
+        handle = RunHandle(self.TEST_DATA_FILEPATH, name='run1')
+        handle.load()
+        handle = pickle.loads(pickle.dumps(handle))
+        self.assertFalse(handle.is_loaded)
+        self.assertEqual('run1', handle.name)
+
+    def test_RunHandle_read_rows(self):
+        handle = RunHandle(self.TEST_DATA_FILEPATH)
+        rows = handle.read_rows([6, 1], ['A', 'C'])
+        self.assertFalse(handle.is_loaded)
+        self.assertEqual([1, 6], rows.index.tolist())
+        self.assertAllClose([9., 5.], rows['A'].tolist())
+        self.assertAllClose([2., 9.], rows['C'].tolist())
+
+    def test_RunHandle_read_rows_index_col(self):
+        handle = RunHandle(self.TEST_DATA_FILEPATH, index_col='TIME')
+        rows = handle.read_rows([0.6, 0.1], ['A', 'C'])
+        self.assertFalse(handle.is_loaded)
+        self.assertAllClose([0.1, 0.6], rows.index.tolist())
+        self.assertAllClose([9., 5.], rows['A'].tolist())
+        self.assertAllClose([2., 9.], rows['C'].tolist())
+        handle.load()
+        self.assertAllClose([9., 5.], handle.read_rows([0.6, 0.1], ['A'])['A'].tolist())
+        with self.assertRaises(KeyError):
+            handle.read_rows([0.15])
+
+    def setup_cache(self):
+        cache = RunCache(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache.directory)
+        return cache
+
+    def test_read_csv_cache(self):
+        cache = self.setup_cache()
+        run1 = Run.read_csv(self.TEST_DATA_FILEPATH, cache=cache)
+        self.assertIsNotNone(cache.get(self.TEST_DATA_FILEPATH))
+        run2 = Run.read_csv(self.TEST_DATA_FILEPATH, name='run', cache=cache)
+        self.assertTrue(isinstance(run2, Run))
+        self.assertEqual('run', run2.name)
+        self.assertEqual(self.TEST_DATA_FILEPATH, run2.filepath)
+        self.assertTrue(isinstance(run2['A'].values, np.memmap))
+        pd.testing.assert_frame_equal(pd.DataFrame(run1), pd.DataFrame(run2))
+
+    def test_read_csv_cache_read_kwargs(self):
+        cache = self.setup_cache()
+        Run.read_csv(self.TEST_DATA_FILEPATH, cache=cache)
+        self.assertIsNone(cache.get(self.TEST_DATA_FILEPATH, index_col='TIME'))
+        run = Run.read_csv(self.TEST_DATA_FILEPATH, cache=cache, index_col='TIME')
+        cached = Run.read_csv(self.TEST_DATA_FILEPATH, cache=cache, index_col='TIME')
+        self.assertEqual('TIME', cached.index.name)
+        self.assertAllClose(run.index, cached.index)
+
+    def test_read_csv_cache_is_writable(self):
+        cache = self.setup_cache()
+        Run.read_csv(self.TEST_DATA_FILEPATH, cache=cache)
+        run = Run.read_csv(self.TEST_DATA_FILEPATH, cache=cache)
+        run.loc[0, 'A'] = 100.
+        self.assertEqual(1., Run.read_csv(self.TEST_DATA_FILEPATH, cache=cache)['A'][0])
+
+    def test_run_cache_invalidated_by_file_change(self):
+        cache = self.setup_cache()
+        filepath = os.path.join(cache.directory, "data.csv")
+        shutil.copy(self.TEST_DATA_FILEPATH, filepath)
+        Run.read_csv(filepath, cache=cache)
+        self.assertIsNotNone(cache.get(filepath))
+        with open(filepath, 'a') as f:
+            f.write("\n0.8,1.,1.,1.,1.,1.")
+        self.assertIsNone(cache.get(filepath))
+        self.assertEqual(9, len(Run.read_csv(filepath, cache=cache)))
+        self.assertEqual(9, len(cache.get(filepath)))
+
+    def test_run_cache_sidecar(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "data.csv")
+        shutil.copy(self.TEST_DATA_FILEPATH, filepath)
+        cache = RunCache()
+        Run.read_csv(filepath, cache=cache)
+        self.assertTrue(os.path.isdir(filepath + RunCache.SIDECAR_SUFFIX))
+        self.assertAllClose([1., 9., 6., 4., 7., 3., 5., 4.], cache.get_column(filepath, 'A'))
+        cache.invalidate(filepath)
+        self.assertIsNone(cache.get(filepath))
+
+    def test_run_cache_unwritable(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "data.csv")
+        shutil.copy(self.TEST_DATA_FILEPATH, filepath)
+        # a file in place of the sidecar directory
+        open(filepath + RunCache.SIDECAR_SUFFIX, 'w').close()
+        cache = RunCache()
+        run = Run.read_csv(filepath, cache=cache)
+        self.assertEqual(8, len(run))
+        self.assertFalse(cache.put(filepath, run))
+        self.assertIsNone(cache.get(filepath))
+
+    def test_run_cache_skips_text_columns(self):
+        cache = self.setup_cache()
+        self.assertFalse(cache.put(self.TEST_DATA_FILEPATH, pd.DataFrame({'A': ['a', 'b']})))
+        self.assertIsNone(cache.get(self.TEST_DATA_FILEPATH))
+
+    def test_RunHandle_read_rows_cached(self):
+        cache = self.setup_cache()
+        RunHandle(self.TEST_DATA_FILEPATH, cache=cache).load()
+        handle = RunHandle(self.TEST_DATA_FILEPATH, cache=cache)
+        rows = handle.read_rows([6, 1], ['A', 'C'])
+        self.assertFalse(handle.is_loaded)
+        self.assertEqual([1, 6], rows.index.tolist())
+        self.assertAllClose([9., 5.], rows['A'].tolist())
+
+    def test_LazyRun_loads_columns_on_access(self):
+        cache = self.setup_cache()
+        run = LazyRun(self.TEST_DATA_FILEPATH, cache=cache)
+        self.assertEqual((), run.loaded_columns)
+        self.assertIsNone(cache.get_meta(self.TEST_DATA_FILEPATH))
+        a = run['A']
+        self.assertEqual(('A',), run.loaded_columns)
+        self.assertTrue(isinstance(a.values, np.memmap))
+        self.assertAllClose([1., 9., 6., 4., 7., 3., 5., 4.], a.tolist())
+        self.assertEqual(['TIME', 'A', 'B', 'C', 'D', 'E'], run.columns.tolist())
+        self.assertEqual(8, len(run))
+
+    def test_LazyRun_select_columns_returns_run(self):
+        run = LazyRun(self.TEST_DATA_FILEPATH, name='run', description='lazy', cache=self.setup_cache())
+        subset = run[['A', 'C']]
+        self.assertTrue(isinstance(subset, Run))
+        self.assertEqual('run', subset.name)
+        self.assertEqual('lazy', subset.description)
+        self.assertEqual(('A', 'C'), run.loaded_columns)
+        expected = Run.read_csv(self.TEST_DATA_FILEPATH)
+        pd.testing.assert_frame_equal(pd.DataFrame(expected), pd.DataFrame(run.load()))
+
+    def test_LazyRun_setitem_and_set_index(self):
+        run = LazyRun(self.TEST_DATA_FILEPATH, cache=self.setup_cache())
+        run['F'] = 2.
+        run['A'] = 3.
+        self.assertAllClose([2.] * 8, run['F'].tolist())
+        self.assertAllClose([3.] * 8, run['A'].tolist())
+        run.set_index('TIME', drop=True, inplace=True)
+        self.assertEqual(['A', 'B', 'C', 'D', 'E', 'F'], run.columns.tolist())
+        self.assertAllClose(Run.read_csv(self.TEST_DATA_FILEPATH)['TIME'], run['B'].index)
+
+    def test_LazyRun_read_rows_index_col(self):
+        run = LazyRun(self.TEST_DATA_FILEPATH, cache=self.setup_cache(), index_col='TIME')
+        rows = run.read_rows([0.6, 0.1], ['A'])
+        self.assertAllClose([0.1, 0.6], rows.index.tolist())
+        self.assertAllClose([9., 5.], rows['A'].tolist())
+
+    def test_LazyRun_uncacheable(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "data.csv")
+        pd.DataFrame({'A': [1., 2.], 'B': ['a', 'b']}).to_csv(filepath, index=False)
+        run = LazyRun(filepath, cache=RunCache(os.path.join(directory, "cache")))
+        self.assertEqual(['a', 'b'], run['B'].tolist())
+        self.assertAllClose([1., 2.], run['A'].tolist())
+
+    def test_LazyRun_pickle_drops_columns(self):
+        run = LazyRun(self.TEST_DATA_FILEPATH, cache=self.setup_cache())
+        run['A']
+        run = pickle.loads(pickle.dumps(run))
+        self.assertEqual((), run.loaded_columns)
+        self.assertAllClose([1., 9., 6., 4., 7., 3., 5., 4.], run['A'].tolist())
+
+    def test_RunSet_of_LazyRuns(self):
+        cache = self.setup_cache()
+        runs = [LazyRun(self.TEST_DATA_FILEPATH, name=str(i), cache=cache) for i in range(3)]
+        runset = RunSet(runs)
+        self.assertIs(runs[0], runset.runs['0'])
+        b = runset['B']
+        self.assertEqual(['0', '1', '2'], list(b))
+        self.assertTrue(all(run.loaded_columns == ('B',) for run in runs))
+
+    def test_RunSet_of_RunHandles(self):
+        runset = RunSet([RunHandle(self.TEST_DATA_FILEPATH, name='run1')])
+        run = runset.runs['run1']
+        self.assertTrue(isinstance(run, Run))
+        self.assertEqual(self.TEST_DATA_FILEPATH, run.filepath)
+        runset.set_index('TIME')
+        runset['X'] = 1.
+        self.assertAllClose([0., 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7], run.index.tolist())
+        self.assertAllClose([1.] * 8, run['X'].tolist())
+
+    def test_RunSet_from_files(self):
+        filepaths = [self.TEST_DATA_FILEPATH, os.path.join(self.TESTDIR, "test_data2.csv")]
+        calls = []
+        runset = RunSet.from_files(filepaths, workers=2, progress=lambda *args: calls.append(args))
+        self.assertEqual(set(filepaths), set(runset.run_names))
+        self.assertEqual([(1, 2), (2, 2)], calls)
+        run = runset.runs[self.TEST_DATA_FILEPATH]
+        self.assertTrue(isinstance(run, Run))
+        self.assertEqual(self.TEST_DATA_FILEPATH, run.filepath)
+        pd.testing.assert_frame_equal(pd.DataFrame(Run.read_csv(self.TEST_DATA_FILEPATH)), pd.DataFrame(run))
+
+    def test_RunSet_from_files_glob(self):
+        runset = RunSet.from_files(os.path.join(self.TESTDIR, "test_data*.csv"), workers=2, processes=False,
+                                   index_col='TIME')
+        self.assertEqual(2, len(runset.run_names))
+        self.assertTrue(all(run.index.name == 'TIME' for run in runset.runs.values()))
+        self.assertEqual(set(runset.run_names), set(RunSet.from_files(self.TESTDIR, processes=False).run_names))
+
+    def test_RunSet_from_files_lazy(self):
+        cache = self.setup_cache()
+        runset = RunSet.from_files([self.TEST_DATA_FILEPATH], processes=False, lazy=True, cache=cache)
+        run = runset.runs[self.TEST_DATA_FILEPATH]
+        self.assertTrue(isinstance(run, LazyRun))
+        self.assertIsNotNone(cache.get_meta(self.TEST_DATA_FILEPATH))
+        self.assertEqual((), run.loaded_columns)
+        self.assertAllClose([1., 9., 6., 4., 7., 3., 5., 4.], run['A'].tolist())
+
+    def test_RunSet_add_files_overwrite(self):
+        runset = RunSet([Run.read_csv(self.TEST_DATA_FILEPATH)])
+        with self.assertRaises(ValueError):
+            runset.add_files([self.TEST_DATA_FILEPATH], processes=False)
+        with self.assertRaises(ValueError):
+            RunSet.from_files([self.TEST_DATA_FILEPATH] * 2, processes=False)
+        calls = []
+        runset = RunSet.from_files([self.TEST_DATA_FILEPATH] * 2, processes=False, allow_overwrite=True,
+                                   progress=lambda *args: calls.append(args))
+        self.assertEqual((self.TEST_DATA_FILEPATH,), runset.run_names)
+        self.assertEqual([(1, 1)], calls)
+
+    def setup_stacked_runset(self):
+        run1 = Run.read_csv(self.TEST_DATA_FILEPATH, name='run1')
+        run2 = Run.read_csv(os.path.join(self.TESTDIR, "test_data2.csv"), name='run2')
+        run2.loc[2, 'B'] = np.nan
+        run3 = Run({'A': [], 'B': []}, name='run3')
+        return RunSet([run1, run2, run3])
+
+    def test_RunSet_stack(self):
+        runset = self.setup_stacked_runset()
+        panel = runset.stack()
+        self.assertTrue(isinstance(panel, RunPanel))
+        self.assertEqual(['A', 'B'], panel.columns.tolist())
+        self.assertEqual(('run1', 'run2', 'run3'), panel.names)
+        frame = panel.frame
+        self.assertEqual(['run', 'row'], list(frame.index.names))
+        self.assertAllClose(runset.runs['run2']['A'], frame.loc['run2', 'A'])
+        self.assertTrue(np.shares_memory(panel.values, frame.values))
+        with self.assertRaises(KeyError):
+            runset.stack('C')
+
+    def test_RunSet_stack_text_columns(self):
+        run1 = Run({'A': [1., 2.], 'S': ['a', 'b'], 'F': [True, False]}, name='run1')
+        run2 = Run({'A': [3., 4.], 'S': ['c', 'd'], 'F': [False, False]}, name='run2')
+        runset = RunSet([run1, run2])
+        panel = runset.stack()
+        self.assertEqual(['A', 'F'], panel.columns.tolist())
+        self.assertAllClose([4., 1.], panel.max().tolist())
+        with self.assertRaises(ValueError):
+            runset.stack(['A', 'S'])
+
+    def test_RunPanel_reductions(self):
+        runset = self.setup_stacked_runset()
+        panel = runset.stack(['A', 'B'])
+        frames = [runset.runs[name][['A', 'B']] for name in ('run1', 'run2')]
+        stacked = pd.concat(frames)
+        pd.testing.assert_series_equal(stacked.max(), panel.max(), check_names=False)
+        pd.testing.assert_series_equal(stacked.min(), panel.min(), check_names=False)
+        pd.testing.assert_series_equal(stacked.quantile(0.3), panel.quantile(0.3), check_names=False)
+
+        per_run = panel.quantile(0.3, per_run=True)
+        for name, frame in zip(('run1', 'run2'), frames):
+            self.assertAllClose(frame.quantile(0.3), per_run.loc[name])
+            self.assertAllClose(frame.max(), panel.max(per_run=True).loc[name])
+            self.assertAllClose(frame.min(), panel.min(per_run=True).loc[name])
+        self.assertTrue(panel.max(per_run=True).loc['run3'].isna().all())
+        self.assertTrue(per_run.loc['run3'].isna().all())
+
+    def test_RunPanel_argmax(self):
+        runset = self.setup_stacked_runset()
+        panel = runset.stack(['A', 'B'])
+        location = panel.argmax()
+        self.assertEqual(['run1', 'run2'], location['run'].tolist())
+        self.assertEqual([1, 0], location['index'].tolist())
+        self.assertAllClose([9., 9.], location['value'])
+        # ties go to the first run and row
+        location = panel.argmin()
+        self.assertEqual(['run1', 'run1'], location['run'].tolist())
+        self.assertEqual([0, 2], location['index'].tolist())
+
+        per_run = panel.argmax(per_run=True)
+        self.assertEqual([1, 4], per_run.loc['run1'].tolist())
+        self.assertEqual([runset.runs['run2']['A'].idxmax(), runset.runs['run2']['B'].idxmax()],
+                         per_run.loc['run2'].tolist())
+        self.assertEqual([None, None], per_run.loc['run3'].tolist())
+
+    def test_RunSummary_describe(self):
+        run = Run.read_csv(self.TEST_DATA_FILEPATH)
+        statistics = RunSummary.describe(run)
+        self.assertEqual(9., statistics[('max', 'A')])
+        self.assertEqual(1., statistics[('min', 'B')])
+        self.assertAllClose(run['C'].mean(), statistics[('mean', 'C')])
+        self.assertEqual(8., statistics[('count', 'E')])
+
+    def test_RunSet_where(self):
+        run1 = Run.read_csv(self.TEST_DATA_FILEPATH, name='run1')
+        run2 = Run.read_csv(os.path.join(self.TESTDIR, "test_data2.csv"), name='run2')
+        runset = RunSet([run1, run2])
+        matches = runset.where(max__B__gt=8)
+        self.assertEqual(('run2',), matches.run_names)
+        self.assertIs(run2, matches.runs['run2'])
+        self.assertEqual(('run1', 'run2'), runset.where(min__A__le=1.).run_names)
+        self.assertEqual(('run1',), runset.where(min__A__le=1., count__A__eq=8).run_names)
+        self.assertEqual(('run1',), runset.where(max__E__ge=0.).run_names)
+        self.assertEqual(('run1',), runset.where(max__E__ne=5.).run_names)
+        self.assertEqual((), runset.where(max__F__gt=0.).run_names)
+        with self.assertRaises(ValueError):
+            runset.where(max__B=8)
+        with self.assertRaises(ValueError):
+            runset.where(median__B__gt=8)
+
+    def test_RunSummary_save_load_names(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "summary.npz")
+        name = uuid4()
+        summary = RunSummary()
+        summary.add(name, RunSummary.describe(Run({'A': [1., 2.]})))
+        summary.add('run2', RunSummary.describe(Run({'A': [3., 4.]})))
+        summary.save(filepath)
+        loaded = RunSummary.load(filepath)
+        self.assertEqual((name, 'run2'), loaded.names)
+        self.assertEqual([name], loaded.query(max__A__lt=3.))
+        summary.add(('run', 3), {})
+        with self.assertRaises(ValueError):
+            summary.save(filepath)
+
+    def test_RunSet_where_after_setitem(self):
+        runset = RunSet([Run.read_csv(self.TEST_DATA_FILEPATH, name='run1')])
+        self.assertEqual(('run1',), runset.where(max__A__gt=8).run_names)
+        runset['A'] = 3.
+        self.assertEqual((), runset.where(max__A__gt=8).run_names)
+        runset.remove_run('run1')
+        self.assertEqual(0, len(runset.summary))
+
+    def test_RunSet_where_LazyRun_after_setitem(self):
+        cache = self.setup_cache()
+        runset = RunSet([LazyRun(self.TEST_DATA_FILEPATH, name='run1', cache=cache)])
+        runset['Z'] = 20.
+        self.assertEqual(('run1',), runset.where(max__Z__gt=10).run_names)
+        runset.set_index('TIME', drop=True)
+        self.assertEqual((), runset.where(max__TIME__ge=0.).run_names)
+
+    def test_RunSet_where_from_saved_summary(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filepath = os.path.join(directory, "data.csv")
+        shutil.copy(self.TEST_DATA_FILEPATH, filepath)
+        cache = RunCache(os.path.join(directory, "cache"))
+
+        runset = RunSet.from_files([filepath], processes=False, cache=cache)
+        self.assertTrue(runset.summary.is_current(filepath, filepath))
+        self.assertEqual(9., runset.summary.table.loc[filepath, ('max', 'A')])
+        runset.summary.save(os.path.join(directory, "summary.npz"))
+
+        summary = RunSummary.load(os.path.join(directory, "summary.npz"))
+        # the query is answered from the loaded summary, which is altered here to show it is used
+        statistics = dict(summary.table.loc[filepath].dropna().items())
+        statistics[('max', 'A')] = 100.
+        summary.add(filepath, statistics, filepath)
+        runset = RunSet.from_files([filepath], processes=False, lazy=True, cache=cache, summary=summary)
+        run = runset.runs[filepath]
+        self.assertEqual((filepath,), runset.where(max__A__gt=50).run_names)
+        self.assertEqual((), run.loaded_columns)
+
+        with open(filepath, 'a') as f:
+            f.write("\n0.8,200.,1.,1.,1.,1.")
+        self.assertFalse(runset.summary.is_current(filepath, filepath))
+        self.assertEqual((), runset.where(max__A__gt=50, max__A__lt=150).run_names)
+        self.assertEqual((filepath,), runset.where(max__A__eq=200).run_names)
+
 
 if __name__ == '__main__':
     unittest.main()